@@ -0,0 +1,108 @@
+import hashlib
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from bitboard import BitBoard
+from engine import DISTINCT_ROTATIONS, FIELD_TILE, TILE_STAMPS, NEIGHBOURS
+from hints import evaluate_game, best_moves
+
+# ==============================================================================
+# 電腦對手：Expectimax 搜尋 (擲骰為機率節點，放置位置 x 旋轉為決策節點)
+# 盤面以 Zobrist 雜湊為鍵存入置換表，跨回合保留，下一回合可直接沿用已搜尋過的子樹
+# 搜尋節點使用位元棋盤：複製與放置只是整數運算，評估只需幾次位移擴張
+# ==============================================================================
+
+# 每個旋轉對應到圖樣相同的最小旋轉，讓等價的盤面得到相同雜湊
+CANONICAL_ROTATION = {t: tuple(next(j for j in range(4) if np.array_equal(stamps[j], stamps[k])) for k in range(4)) for t, stamps in TILE_STAMPS.items()}
+
+@lru_cache(maxsize=None)
+def zobrist_key(r, c, tile_type, rotation, owner_id):
+    digest = hashlib.blake2b(repr((r, c, tile_type, CANONICAL_ROTATION[tile_type][rotation], owner_id)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+def board_hash(board):
+    h = 0
+    for r, c, (tile_type, owner_id, rotation) in board.placed_tiles():
+        h ^= zobrist_key(r, c, tile_type, rotation, owner_id)
+    return h
+
+class SearchTimeout(Exception):
+    pass
+
+class ExpectimaxAI:
+    def __init__(self, time_budget=1.0, max_depth=6, table_limit=1_000_000):
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.table_limit = table_limit
+        # (雜湊, 行動玩家, 板塊) -> (搜尋深度, 評估值)；評估值一律為玩家1 減玩家2，兩邊共用同一張表也不會錯
+        self.table = {}
+        self.me, self.deadline, self.nodes = 0, 0.0, 0
+
+    def evaluate(self, board):
+        scores = board.scores()
+        return scores[0] - scores[1]
+
+    def choose_move(self, game):
+        # 回傳 (r, c, rotation)；時間用盡時採用最後一個完整深度的結果，一層都沒搜完時用一步貪婪的落點
+        self.me, self.deadline, self.nodes = game.current_player_index, time.perf_counter() + self.time_budget, 0
+        if len(self.table) > self.table_limit: self.table.clear()
+        tile_type, owner_id, _ = game.pending_tile()
+        if game.game_phase == "SETUP": return self._setup_move(game.board)
+        best_move = self._greedy_move(game)
+        h = board_hash(game.board)
+        bits = BitBoard.from_board(game.board)
+        for depth in range(1, self.max_depth + 1):
+            try: best_move, _ = self._decide(bits, h, tile_type, owner_id, self.me, depth, root=True)
+            except SearchTimeout: break
+            if len(game.board.empty) <= depth: break
+        return best_move
+
+    def _greedy_move(self, game):
+        # 與深度 1 相同的評估 (自己 - 對手)，但由水網追蹤器一次算完，不受時間限制
+        r, c, rotation, _, _ = best_moves(evaluate_game(game), self.me)[0]
+        return r, c, rotation
+
+    def _setup_move(self, board):
+        # 設置階段尚無水路可評估，優先選四周空位最多的格子 (可連接的水路較多)
+        def open_sides(cell):
+            r, c = cell
+            return sum(1 for dr, dc in NEIGHBOURS if 0 <= r + dr < board.rows and 0 <= c + dc < board.cols and board.is_empty(r + dr, c + dc))
+        r, c = max(board.empty_cells(), key=open_sides)
+        return r, c, 0
+
+    def _decide(self, board, h, tile_type, owner_id, mover, depth, root=False):
+        key = (h, mover, tile_type)
+        entry = self.table.get(key)
+        if entry and entry[0] >= depth and not root: return None, entry[1]
+        maximizing = mover == 0
+        best_move, best_value = None, None
+        for r, c in board.empty_cells():
+            for rotation in DISTINCT_ROTATIONS[tile_type]:
+                # 每個候選都檢查時間：大棋盤上單一節點的迴圈就可能超過整個預算
+                if time.perf_counter() > self.deadline: raise SearchTimeout
+                child = board.copy()
+                child.place(r, c, tile_type, owner_id, rotation)
+                self.nodes += 1
+                value = self._chance(child, h ^ zobrist_key(r, c, tile_type, rotation, owner_id), 1 - mover, depth - 1)
+                if best_value is None or (value > best_value if maximizing else value < best_value):
+                    best_move, best_value = (r, c, rotation), value
+        self.table[key] = (depth, best_value)
+        return best_move, best_value
+
+    def _chance(self, board, h, mover, depth):
+        if depth == 0 or board.is_full(): return self.evaluate(board)
+        total = 0
+        for tile_type in range(1, 7):
+            owner_id = mover + 1 if tile_type == FIELD_TILE else None
+            total += self._decide(board, h, tile_type, owner_id, mover, depth)[1]
+        return total / 6
+
+    def start(self, game, callback):
+        # 在背景執行緒搜尋，避免 Tk 主迴圈卡住；callback 在背景執行緒中被呼叫
+        snapshot = game.copy()
+        thread = threading.Thread(target=lambda: callback(self.choose_move(snapshot)), daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from engine import FIXED_TILES
+
+# ==============================================================================
+# 預先烘焙的圖片集：所有板塊的每個可見旋轉與骰子面，依顯示尺寸縮放後拼成一張 PNG
+# 以來源圖檔內容與尺寸的雜湊命名，來源或尺寸改變時自動重建；啟動時只需解碼一次
+# ==============================================================================
+ATLAS_VERSION = 1
+DICE_WORDS = {1: 'one', 2: 'two', 3: 'three', 4: 'four', 5: 'five', 6: 'six'}
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def default_cache_dir():
+    return os.environ.get("TERRAWEAVE_CACHE") or os.path.join(os.path.expanduser("~"), ".cache", "terraweave")
+
+def tile_rotations(tile_type):
+    # 不可旋轉的板塊只會以原方向顯示
+    return (0,) if tile_type in FIXED_TILES else (0, 1, 2, 3)
+
+def source_files(asset_dir=ASSET_DIR):
+    files = {}
+    for i in range(1, 7):
+        filepath = os.path.join(asset_dir, f"{i}.png")
+        if not os.path.exists(filepath): raise FileNotFoundError(f"板塊圖片遺失: {i}.png")
+        files[f"tile:{i}"] = filepath
+    for i, word in DICE_WORDS.items():
+        filename = f"dice-six-faces-{word}.png"
+        filepath = os.path.join(asset_dir, filename)
+        if not os.path.exists(filepath): raise FileNotFoundError(f"骰子圖片遺失: {filename}")
+        files[f"dice:{i}"] = filepath
+    return files
+
+def atlas_hash(files, tile_pixel_size, dice_size):
+    # 只讀取原始位元組，不解碼圖片
+    digest = hashlib.sha256(f"{ATLAS_VERSION}:{tile_pixel_size}:{dice_size}".encode())
+    for key in sorted(files):
+        with open(files[key], "rb") as f: digest.update(key.encode() + b"\0" + f.read())
+    return digest.hexdigest()[:16]
+
+def build_atlas(files, tile_pixel_size, dice_size):
+    from PIL import Image
+    tile_sprites, dice_sprites = [], []
+    for i in range(1, 7):
+        base = Image.open(files[f"tile:{i}"]).resize((tile_pixel_size, tile_pixel_size), Image.LANCZOS)
+        for rotation in tile_rotations(i): tile_sprites.append((f"tile:{i}:{rotation}", base.rotate(-90 * rotation)))
+    for i in range(1, 7):
+        dice_sprites.append((f"dice:{i}", Image.open(files[f"dice:{i}"]).convert("RGBA").resize((dice_size, dice_size), Image.LANCZOS)))
+    # 板塊排成第一列，骰子排在下一列
+    layout, y = {}, 0
+    for row in (tile_sprites, dice_sprites):
+        x = 0
+        for key, image in row:
+            layout[key] = (x, y, image.width, image.height)
+            x += image.width
+        y += max(image.height for _, image in row)
+    width = max(sum(image.width for _, image in row) for row in (tile_sprites, dice_sprites))
+    sheet = Image.new("RGBA", (width, y), (0, 0, 0, 0))
+    for key, image in tile_sprites + dice_sprites: sheet.paste(image, layout[key][:2])
+    return sheet, layout
+
+def save_atlas(sheet, layout, digest, path):
+    from PIL import PngImagePlugin
+    info = PngImagePlugin.PngInfo()
+    info.add_text("terraweave-atlas", json.dumps({"hash": digest, "sprites": layout}))
+    # 先寫入暫存檔再改名，多個實例同時啟動也不會讀到寫了一半的檔案
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".png")
+    with os.fdopen(fd, "wb") as f: sheet.save(f, format="PNG", pnginfo=info)
+    os.replace(tmp_path, path)
+
+class SpriteAtlas:
+    def __init__(self, tile_pixel_size=80, dice_size=40, cache_dir=None, asset_dir=ASSET_DIR):
+        from PIL import Image
+        files = source_files(asset_dir)
+        digest = atlas_hash(files, tile_pixel_size, dice_size)
+        self.path = os.path.join(cache_dir or default_cache_dir(), f"atlas-{digest}.png")
+        self.rebuilt = False
+        self._images = {}
+        try:
+            self.sheet = Image.open(self.path)
+            self.sheet.load()  # 唯一一次解碼
+            self.sprites = {key: tuple(box) for key, box in json.loads(self.sheet.text["terraweave-atlas"])["sprites"].items()}
+            return
+        except (OSError, KeyError, ValueError):
+            pass  # 尚未建立或檔案損毀，重新建立
+        self.sheet, self.sprites = build_atlas(files, tile_pixel_size, dice_size)
+        self.rebuilt = True
+        try: save_atlas(self.sheet, self.sprites, digest, self.path)
+        except OSError: pass  # 快取目錄不可寫入時仍可使用記憶體中的圖片集
+
+    def image(self, key):
+        # 需要時才裁切，並保留結果
+        if key not in self._images:
+            x, y, w, h = self.sprites[key]
+            self._images[key] = self.sheet.crop((x, y, x + w, y + h))
+        return self._images[key]
+
+    def tile(self, tile_type, rotation):
+        if tile_type in FIXED_TILES: rotation = 0
+        return self.image(f"tile:{tile_type}:{rotation}")
+
+    def dice(self, face): return self.image(f"dice:{face}")
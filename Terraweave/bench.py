@@ -0,0 +1,158 @@
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from engine import Board, SparseBoard, GameState, BOARD_ROWS, BOARD_COLS, TILE_PATTERNS, find_all_water_networks, rotate_matrix
+from bitboard import random_board
+from hints import evaluate_moves
+
+# ==============================================================================
+# 效能基準：以固定種子產生的盤面 (空 / 半滿 / 全滿，預設與放大尺寸) 量測
+# 各函式的延遲、保留的配置區塊數與記憶體峰值；可存成基準檔並與之比較找出退步
+# ==============================================================================
+SIZES = {"default": (BOARD_ROWS, BOARD_COLS), "large": (20, 30)}
+FILLS = {"empty": 0.0, "half": 0.5, "full": 1.0}
+
+def board_fixture(size, fill, seed=0, sparse=False):
+    rows, cols = SIZES[size]
+    return random_board(random.Random(f"{seed}:{size}:{fill}"), fill=round(rows * cols * FILLS[fill]), rows=rows, cols=cols, sparse=sparse)
+
+def engine_benchmarks(seed):
+    for size in SIZES:
+        for fill in FILLS:
+            board = board_fixture(size, fill, seed)
+            tag = f"{size}/{fill}"
+            for mode in ("bfs", "components", "bitboard"):
+                if mode == "bfs" and size == "large" and fill != "empty": continue  # 原始 BFS 在大地圖上過慢
+                yield f"analyze[{mode}] {tag}", lambda board=board, mode=mode: board.analyze(mode=mode)
+            yield f"score {tag}", lambda board=board: board.score().scores
+            if fill != "full":
+                yield f"evaluate_moves {tag}", lambda board=board: [evaluate_moves(board, tile_type, 1) for tile_type in range(1, 7)]
+            master_grid = board.grid.tolist()
+            yield f"find_all_water_networks {tag}", lambda grid=master_grid: find_all_water_networks(grid, len(grid), len(grid[0]))
+            moves = list(board.placed_tiles())
+            for storage in (Board, SparseBoard):
+                def replay(moves=moves, storage=storage, rows=board.rows, cols=board.cols):
+                    fresh = storage(rows, cols)
+                    for r, c, tile_data in moves: fresh.place(r, c, *tile_data)
+                    return fresh
+                if moves: yield f"place_all[{storage.__name__}] {tag}", replay
+    yield "rotate_matrix", lambda: [rotate_matrix(pattern) for pattern in TILE_PATTERNS.values()]
+
+def render_benchmarks(seed):
+    # 需要顯示器與圖片資源；無法建立 Tk 視窗時略過
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+        root.withdraw()
+    except Exception as e:
+        print(f"略過繪圖基準: {e}", file=sys.stderr)
+        return
+    import importlib.util, os
+    spec = importlib.util.spec_from_file_location("land", os.path.join(os.path.dirname(os.path.abspath(__file__)), "land1.1.py"))
+    land = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(land)
+    for size in SIZES:
+        rows, cols = SIZES[size]
+        board = board_fixture(size, "full", seed)
+        moves = list(board.placed_tiles())
+        for render_mode in ("raster", "canvas"):
+            window = tk.Toplevel(root)
+            app = land.RiverGameGUI(window, rows=rows, cols=cols, tile_pixel_size=80 if size == "default" else 24, render_mode=render_mode)
+            def place_all(app=app, moves=moves, rows=rows, cols=cols):
+                # 每輪都從新棋盤與新的顯示畫面開始
+                app.game = GameState(rows=rows, cols=cols)
+                app.reset_board_view()
+                for r, c, tile_data in moves:
+                    app.game.board.place(r, c, *tile_data)
+                    app.place_tile_on_board(r, c, *tile_data)
+                app.board_canvas.update_idletasks()
+            yield f"place_tile_on_board[{render_mode}] x{len(moves)} {size}/full", place_all
+            # 結果畫面的背景也依繪製方式而不同 (點陣底圖 / 逐格畫布項目)，兩種都量
+            def show_results(app=app, board=board):
+                before = set(app.master.winfo_children())
+                app.display_results_window(board.score())
+                app.master.update_idletasks()
+                for child in set(app.master.winfo_children()) - before: child.destroy()
+            yield f"display_results_window[{render_mode}] {size}/full", show_results
+
+def measure(func, repeat, min_time=0.05):
+    # 延遲：先決定每輪呼叫次數讓單輪至少 min_time 秒，再取各輪平均的中位數與最小值
+    loops, elapsed = 1, 0.0
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops): func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or loops >= 1 << 20: break
+        loops *= 2
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(loops): func()
+        timings.append((time.perf_counter() - started) / loops)
+    # 記憶體峰值與呼叫結束時仍存活的配置區塊數 (即結果保留下來的配置)：單次呼叫
+    # 呼叫中途配置又釋放的暫存區塊不計入區塊數 (tracemalloc 只看得到存活的區塊)，只反映在峰值上
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    del result
+    retained_blocks = sum(stat.count_diff for stat in after.compare_to(before, "lineno") if stat.count_diff > 0)
+    return {"median_us": statistics.median(timings) * 1e6, "min_us": min(timings) * 1e6, "loops": loops,
+            "retained_blocks": retained_blocks, "peak_kib": peak / 1024}
+
+def run(filter_text=None, repeat=5, seed=0, render=True):
+    results = {}
+    suites = [engine_benchmarks(seed)] + ([render_benchmarks(seed)] if render else [])
+    for suite in suites:
+        for name, func in suite:
+            if filter_text and filter_text not in name: continue
+            results[name] = measure(func, repeat)
+            r = results[name]
+            print(f"{name:<52} {r['median_us']:>12.1f} us  {r['retained_blocks']:>8} retained  {r['peak_kib']:>10.1f} KiB peak")
+    return results
+
+def compare(results, baseline, threshold):
+    # 最小延遲 (受背景負載影響最小) 或記憶體峰值比基準高出 threshold 以上視為退步
+    regressions = []
+    for name, r in results.items():
+        if name not in baseline: continue
+        b = baseline[name]
+        for key in ("min_us", "peak_kib"):
+            if b[key] > 0 and r[key] > b[key] * (1 + threshold):
+                regressions.append(f"{name}: {key} {b[key]:.1f} -> {r[key]:.1f} (+{(r[key] / b[key] - 1) * 100:.0f}%)")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="河流農場 效能基準")
+    parser.add_argument("-k", "--filter", help="只執行名稱包含此字串的項目")
+    parser.add_argument("--repeat", type=int, default=5, help="每個項目量測的輪數")
+    parser.add_argument("--seed", type=int, default=0, help="盤面種子")
+    parser.add_argument("--no-render", action="store_true", help="略過需要 Tk 的繪圖基準")
+    parser.add_argument("--save", help="將結果存成基準檔 (JSON)")
+    parser.add_argument("--compare", help="與基準檔比較")
+    parser.add_argument("--threshold", type=float, default=0.25, help="視為退步的增幅 (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    results = run(args.filter, args.repeat, args.seed, render=not args.no_render)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(), "seed": args.seed, "results": results}, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f: baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions: print(f"退步: {line}")
+        if regressions: return 1
+        print("沒有退步")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+import argparse
+import random
+import time
+from functools import lru_cache
+
+from engine import Board, SparseBoard, BOARD_ROWS, BOARD_COLS, TILE_SIZE, TILE_STAMPS, FIELD_TILE, SOURCE_TILE, ScoreReport, field_border_cells
+from hints import evaluate_moves
+
+# ==============================================================================
+# 位元棋盤：整個水網遮罩存成一個任意精度整數 (第 r*寬 + c 位元代表一格)
+# 連通以「位移 + 遮罩」反覆擴張求得，田地與水源是否相連只需幾次位元運算
+# ==============================================================================
+
+class RegionMasks(dict):
+    # 各板塊的遮罩在第一次用到時才建立：大棋盤上一次建完全部位置要好幾秒
+    def __init__(self, build):
+        super().__init__()
+        self.build = build
+
+    def __missing__(self, key):
+        mask = self[key] = self.build(*key)
+        return mask
+
+@lru_cache(maxsize=None)
+def grid_masks(rows, cols):
+    # 每個棋盤尺寸只算一次：行邊界遮罩、各板塊區域、田地外緣、各圖樣在各位置的水格遮罩
+    width = cols * TILE_SIZE
+    height = rows * TILE_SIZE
+    full = (1 << (width * height)) - 1
+    first_col = sum(1 << (r * width) for r in range(height))
+    not_first_col = full & ~first_col
+    not_last_col = full & ~(first_col << (width - 1))
+    tile_mask = sum(1 << (r_sub * width + c_sub) for r_sub in range(TILE_SIZE) for c_sub in range(TILE_SIZE))
+    def border(r, c):
+        # 先在原點附近組出小整數再整體位移，避免對整張棋盤大小的整數逐位元相加
+        cells = [r_cell * width + c_cell for r_cell, c_cell in field_border_cells(r, c, rows, cols)]
+        base = min(cells, default=0)
+        return sum(1 << (i - base) for i in cells) << base
+    tile_region = RegionMasks(lambda r, c: tile_mask << (r * TILE_SIZE * width + c * TILE_SIZE))
+    border_region = RegionMasks(border)
+    stamps = {}
+    for tile_type, tile_stamps in TILE_STAMPS.items():
+        for rotation, stamp in enumerate(tile_stamps):
+            stamps[(tile_type, rotation)] = sum(1 << (r_sub * width + c_sub) for r_sub, c_sub in zip(*(idx.tolist() for idx in stamp.nonzero())))
+    return width, not_first_col, not_last_col, tile_region, border_region, stamps
+
+class BitBoard:
+    def __init__(self, rows, cols):
+        self.rows, self.cols = rows, cols
+        self.width, self.not_first_col, self.not_last_col, self.tile_region, self.border_region, self.stamps = grid_masks(rows, cols)
+        self.water = 0
+        self.occupied = 0  # 第 r*cols + c 位元表示該板塊格已放置
+        self.fields = {1: [], 2: []}
+        self.sources = []
+
+    @classmethod
+    def from_board(cls, board):
+        bits = cls(board.rows, board.cols)
+        for r, c, tile_data in board.placed_tiles(): bits.place(r, c, *tile_data)
+        return bits
+
+    def copy(self):
+        other = BitBoard.__new__(BitBoard)
+        other.__dict__.update(self.__dict__)
+        other.fields = {1: self.fields[1][:], 2: self.fields[2][:]}
+        other.sources = self.sources[:]
+        return other
+
+    def is_empty(self, r, c): return not (self.occupied >> (r * self.cols + c)) & 1
+
+    def is_full(self): return self.occupied == (1 << (self.rows * self.cols)) - 1
+
+    def empty_cells(self):
+        return [(r, c) for r in range(self.rows) for c in range(self.cols) if not (self.occupied >> (r * self.cols + c)) & 1]
+
+    def place(self, r, c, tile_type, owner_id, rotation):
+        self.occupied |= 1 << (r * self.cols + c)
+        if tile_type == FIELD_TILE: self.fields[owner_id].append((r, c))
+        elif tile_type == SOURCE_TILE: self.sources.append((r, c))
+        mask = self.stamps.get((tile_type, rotation), 0)
+        if mask: self.water |= mask << (r * TILE_SIZE * self.width + c * TILE_SIZE)
+
+    def flood(self, seed):
+        # 反覆向四個方向擴張一格直到不再變化；左右位移時遮掉換行造成的錯位
+        water, width = self.water, self.width
+        not_first_col, not_last_col = self.not_first_col, self.not_last_col
+        region = seed & water
+        while True:
+            grown = (region | ((region << 1) & not_first_col) | ((region >> 1) & not_last_col) | (region << width) | (region >> width)) & water
+            if grown == region: return region
+            region = grown
+
+    def is_connected(self, field, source):
+        return bool(self.flood(self.tile_region[source]) & self.border_region[field])
+
+    def source_networks(self):
+        # 每個水源所在的水網只擴張一次，同一水網的水源共用結果
+        networks = []
+        for source in self.sources:
+            region = self.tile_region[source]
+            for network in networks:
+                if network[0] & region: network[1].append(source); break
+            else: networks.append([self.flood(region), [source]])
+        return networks
+
+    def field_sources(self):
+        networks = self.source_networks()
+        return {field: [source for network, sources in networks if network & self.border_region[field] for source in sources]
+                for player_id in [1, 2] for field in self.fields[player_id]}
+
+    def scores(self):
+        networks = self.source_networks()
+        return [sum(len(sources) for field in self.fields[player_id] for network, sources in networks if network & self.border_region[field]) for player_id in [1, 2]]
+
+    def networks(self):
+        remaining, networks, width = self.water, [], self.width
+        while remaining:
+            network = self.flood(remaining & -remaining)
+            remaining &= ~network
+            cells, bits = set(), network
+            while bits:
+                low = bits & -bits
+                cells.add(divmod(low.bit_length() - 1, width))
+                bits ^= low
+            networks.append(cells)
+        return networks
+
+class BitboardReport(ScoreReport):
+    # 與 ScoreReport 相同介面；分數以位元運算求得，路徑仍在需要時以 BFS 重建
+    def __init__(self, board):
+        self.rows, self.cols = board.rows, board.cols
+        self.height, self.width = board.grid.shape
+        self.flat_grid = board.grid.ravel().tolist()
+        self.bits = BitBoard.from_board(board)
+        self.fields_by_player, self.source_tiles = board.fields_and_sources()
+        self.field_sources = self.bits.field_sources()
+        self.scores = [sum(len(self.field_sources[field]) for field in self.fields_by_player[player_id]) for player_id in [1, 2]]
+        self._paths_by_player, self._networks = None, None
+
+    @property
+    def networks(self):
+        if self._networks is None:
+            self._networks = sorted(self.bits.networks(), key=min)
+        return self._networks
+
+# ==============================================================================
+# 與原本逐田地 BFS 交叉比對
+# ==============================================================================
+def random_board(rng, fill=None, rows=None, cols=None, sparse=False):
+    board = (SparseBoard if sparse else Board)(rows or BOARD_ROWS, cols or BOARD_COLS)
+    cells = [(r, c) for r in range(board.rows) for c in range(board.cols)]
+    rng.shuffle(cells)
+    for i, (r, c) in enumerate(cells[:rng.randint(0, len(cells)) if fill is None else fill]):
+        tile_type = FIELD_TILE if i < 2 else rng.randint(1, 6)
+        owner_id = (i % 2) + 1 if tile_type == FIELD_TILE else None
+        board.place(r, c, tile_type, owner_id, rng.randrange(4))
+    return board
+
+CHECK_HINTS = 32
+
+def cross_check(n_boards=500, seed=0, rows=None, cols=None):
+    # 未指定尺寸時每個盤面隨機 1~8 x 1~8，並以相同內容建立稀疏棋盤比對
+    rng = random.Random(seed)
+    for i in range(n_boards):
+        board_rows, board_cols = rows or rng.randint(1, 8), cols or rng.randint(1, 8)
+        state = rng.getstate()
+        board = random_board(rng, rows=board_rows, cols=board_cols)
+        rng.setstate(state)
+        sparse = random_board(rng, rows=board_rows, cols=board_cols, sparse=True)
+        expected = board.analyze(mode="bfs")
+        for candidate, mode in ((board, "components"), (board, "bitboard"), (sparse, "components")):
+            for name, a, b in zip(("grid", "scores", "paths", "fields", "sources", "networks"), expected, candidate.analyze(mode=mode)):
+                if a != b: raise AssertionError(f"第 {i} 個盤面的 {name} 不一致 ({mode})")
+        for candidate in (board, sparse):
+            if BitBoard.from_board(candidate).scores() != candidate.scores(): raise AssertionError(f"第 {i} 個盤面的增量分數不一致")
+        if sorted(map(sorted, board.live_networks())) != sorted(map(sorted, sparse.live_networks())): raise AssertionError(f"第 {i} 個盤面的活水網不一致")
+        # 提示的批次評估：抽樣的落點與 copy + place 後重新計分 (及新增的活水格數) 比對，大地圖也只抽 CHECK_HINTS 個
+        for candidate in (board, sparse):
+            tile_type = rng.randint(1, 6)
+            owner_id = rng.choice((1, 2)) if tile_type == FIELD_TILE else None
+            live_before = sum(map(len, candidate.live_networks()))
+            hints = evaluate_moves(candidate, tile_type, owner_id)
+            for r, c, rotation, scores, live_cells in rng.sample(hints, min(len(hints), CHECK_HINTS)):
+                after = candidate.copy()
+                after.place(r, c, tile_type, owner_id, rotation)
+                if list(scores) != list(after.score().scores) or live_cells != sum(map(len, after.live_networks())) - live_before:
+                    raise AssertionError(f"第 {i} 個盤面的提示與實際放置不一致 ({r}, {c}) 板塊{tile_type} 旋轉{rotation}")
+    return n_boards
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="位元棋盤與 BFS 交叉比對")
+    parser.add_argument("--boards", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rows", type=int, help="固定棋盤列數 (預設隨機)")
+    parser.add_argument("--cols", type=int, help="固定棋盤行數 (預設隨機)")
+    args = parser.parse_args()
+    started = time.perf_counter()
+    print(f"{cross_check(args.boards, args.seed, args.rows, args.cols)} 個隨機盤面一致 ({time.perf_counter() - started:.1f} 秒)")
@@ -0,0 +1,657 @@
+import random
+from array import array
+from collections import deque
+from functools import lru_cache
+
+import numpy as np
+
+import instrument
+
+# ==============================================================================
+# 核心規則引擎 (不依賴 tkinter / PIL，可於伺服器或批次分析中直接使用)
+# ==============================================================================
+TILE_SIZE = 7
+BOARD_ROWS, BOARD_COLS = 4, 6
+# 兩位玩家各一塊田地，之後至少還要有一格可以擲骰放置
+MIN_BOARD_TILES = 3
+SOURCE_TILE, FIELD_TILE = 1, 4
+
+TILE_PATTERNS = {
+    1: [[1,1,1,1,1,1,1], [1,0,0,0,0,0,1], [1,0,0,0,0,0,1], [1,0,0,0,0,0,1], [1,0,0,0,0,0,1], [1,0,0,0,0,0,1], [1,1,1,1,1,1,1]],
+    2: [[0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [1,1,1,1,1,1,1], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0]],
+    3: [[1,1,0,0,0,0,0], [1,1,1,0,0,0,0], [0,1,1,1,0,0,0], [0,0,1,1,1,0,0], [0,0,0,1,1,1,0], [0,0,0,0,1,1,1], [0,0,0,0,0,1,1]],
+    4: [[0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0]],
+    5: [[1,1,0,0,0,1,1], [1,1,1,0,1,1,1], [0,1,1,1,1,1,0], [0,0,1,1,1,0,0], [0,1,1,1,1,1,0], [1,1,1,0,1,1,1], [1,1,0,0,0,1,1]],
+    6: [[0,0,0,0,0,0,0], [1,1,1,1,1,1,1], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [1,1,1,1,1,1,1], [0,0,0,0,0,0,0]],
+}
+# 不可旋轉的板塊 (水源、田地、交叉)
+FIXED_TILES = (1, 4, 5)
+
+def rotate_matrix(matrix):
+    return [list(row)[::-1] for row in zip(*matrix)]
+
+# 預先算好每種板塊在四個旋轉角度下的圖樣，放置時直接整塊寫入
+TILE_STAMPS = {}
+for _tile_type, _pattern in TILE_PATTERNS.items():
+    _base = np.array(_pattern, dtype=np.uint8)
+    TILE_STAMPS[_tile_type] = tuple(np.ascontiguousarray(np.rot90(_base, -k)) for k in range(4))
+    for _stamp in TILE_STAMPS[_tile_type]: _stamp.setflags(write=False)
+# 圖樣相同的旋轉只保留一個 (例如 2、3、6 只有兩種方向)
+DISTINCT_ROTATIONS = {t: tuple(k for k in range(4) if not any(np.array_equal(stamps[k], stamps[j]) for j in range(k))) for t, stamps in TILE_STAMPS.items()}
+EMPTY_STAMP = np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.uint8)
+# 每個圖樣中水格的相對座標，增量更新水網時只需處理這些格子
+TILE_WATER_CELLS = {t: tuple(tuple(zip(*(idx.tolist() for idx in np.nonzero(stamp)))) for stamp in stamps) for t, stamps in TILE_STAMPS.items()}
+
+NEIGHBOURS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+
+def find_all_water_networks(master_grid, rows, cols):
+    visited, networks = set(), []
+    for r in range(rows):
+        for c in range(cols):
+            if master_grid[r][c] == 1 and (r, c) not in visited:
+                current_network, q = set(), deque([(r, c)])
+                visited.add((r, c))
+                while q:
+                    curr_r, curr_c = q.popleft()
+                    current_network.add((curr_r, curr_c))
+                    for dr, dc in NEIGHBOURS:
+                        next_r, next_c = curr_r + dr, curr_c + dc
+                        if 0 <= next_r < rows and 0 <= next_c < cols and \
+                           master_grid[next_r][next_c] == 1 and (next_r, next_c) not in visited:
+                            visited.add((next_r, next_c)); q.append((next_r, next_c))
+                networks.append(current_network)
+    if instrument.ENABLED:
+        instrument.count("bfs_nodes", len(visited))
+        instrument.count("networks_found", len(networks))
+    return networks
+
+def field_border_cells(r_field, c_field, rows, cols):
+    # 田地四條邊界外側緊鄰的格子 (嚴格檢查四邊，禁止對角線跳躍)
+    r0, c0 = r_field * TILE_SIZE, c_field * TILE_SIZE
+    cells = []
+    if r_field > 0: cells.extend((r0 - 1, c0 + k) for k in range(TILE_SIZE))
+    if r_field < rows - 1: cells.extend((r0 + TILE_SIZE, c0 + k) for k in range(TILE_SIZE))
+    if c_field > 0: cells.extend((r0 + k, c0 - 1) for k in range(TILE_SIZE))
+    if c_field < cols - 1: cells.extend((r0 + k, c0 + TILE_SIZE) for k in range(TILE_SIZE))
+    return cells
+
+@lru_cache(maxsize=None)
+def cell_tile_index(rows, cols):
+    # 主網格 (攤平) 每一格所屬板塊的編號 r_tile * cols + c_tile，取代逐一比對水源板塊範圍
+    r_tiles = np.arange(rows * TILE_SIZE) // TILE_SIZE
+    c_tiles = np.arange(cols * TILE_SIZE) // TILE_SIZE
+    return tuple((r_tiles[:, None] * cols + c_tiles[None, :]).ravel().tolist())
+
+def label_water_components(flat_grid, width):
+    # 一次掃描標記所有水網，labels[i] 為 0 表示非水格，水網編號依列優先順序遞增
+    labels, n_labels = [0] * len(flat_grid), 0
+    for start, value in enumerate(flat_grid):
+        if value != 1 or labels[start]: continue
+        n_labels += 1
+        labels[start], stack = n_labels, [start]
+        while stack:
+            i = stack.pop()
+            c = i % width
+            for j in (i + 1 if c + 1 < width else -1, i - 1 if c > 0 else -1, i + width, i - width):
+                if 0 <= j < len(flat_grid) and flat_grid[j] == 1 and not labels[j]:
+                    labels[j] = n_labels; stack.append(j)
+    if instrument.ENABLED: instrument.count("networks_found", n_labels)
+    return labels, n_labels
+
+# ==============================================================================
+# 單次掃描計分：標記水網一次，由田地相鄰的水網直接得出可到達的水源
+# 路徑只有在需要顯示時才逐一田地重建
+# ==============================================================================
+class ScoreReport:
+    def __init__(self, board):
+        self.rows, self.cols = board.rows, board.cols
+        self.grid = board.grid  # 稀疏棋盤每次讀取都會重新展開，只取一次
+        self.height, self.width = self.grid.shape
+        self.flat_grid = self.grid.ravel().tolist()
+        self.labels, self.n_networks = label_water_components(self.flat_grid, self.width)
+        self.fields_by_player, self.source_tiles = board.fields_and_sources()
+        width, labels = self.width, self.labels
+        sources_by_label = {}
+        for r_source, c_source in self.source_tiles:
+            label = labels[r_source * TILE_SIZE * width + c_source * TILE_SIZE]
+            sources_by_label.setdefault(label, []).append((r_source, c_source))
+        self.field_sources, self.scores = {}, [0, 0]
+        for player_id in [1, 2]:
+            for field in self.fields_by_player[player_id]:
+                touching = {labels[r * width + c] for r, c in field_border_cells(*field, self.rows, self.cols)}
+                reachable = [source for label in touching if label for source in sources_by_label.get(label, ())]
+                self.field_sources[field] = reachable
+                self.scores[player_id - 1] += len(reachable)
+        self._paths_by_player, self._networks = None, None
+
+    @property
+    def networks(self):
+        if self._networks is None:
+            networks, width = [set() for _ in range(self.n_networks)], self.width
+            for i, label in enumerate(self.labels):
+                if label: networks[label - 1].add(divmod(i, width))
+            self._networks = networks
+        return self._networks
+
+    @property
+    def paths_by_player(self):
+        if self._paths_by_player is None:
+            self._paths_by_player = {player_id: [path for field in self.fields_by_player[player_id] for path in self.field_paths(field)] for player_id in [1, 2]}
+        return self._paths_by_player
+
+    def field_paths(self, field):
+        # 與原本逐田地 BFS 相同的搜尋順序，因此重建出的路徑完全一致
+        if not self.field_sources.get(field): return []
+        flat_grid, width, n_cells = self.flat_grid, self.width, len(self.flat_grid)
+        cell_tile = cell_tile_index(self.rows, self.cols)
+        source_index = {r * self.cols + c: (r, c) for r, c in self.source_tiles}
+        q, parent, visited = deque(), {}, set()
+        for r, c in field_border_cells(*field, self.rows, self.cols):
+            i = r * width + c
+            if flat_grid[i] == 1 and i not in visited: q.append(i); visited.add(i)
+        ends = {}
+        while q:
+            i = q.popleft()
+            source = source_index.get(cell_tile[i])
+            if source and source not in ends:
+                ends[source] = i
+                if len(ends) == len(self.field_sources[field]): break
+            c = i % width
+            for j in (i + 1 if c + 1 < width else -1, i - 1 if c > 0 else -1, i + width, i - width):
+                if 0 <= j < n_cells and j not in visited and flat_grid[j] == 1:
+                    visited.add(j); parent[j] = i; q.append(j)
+        if instrument.ENABLED: instrument.count("bfs_nodes", len(visited))
+        paths = []
+        for source, end_node in ends.items():
+            path, node = [], end_node
+            while node in parent: path.append(divmod(node, width)); node = parent[node]
+            path.append(divmod(node, width)); path.reverse()
+            paths.append({'field': field, 'source': source, 'path': path})
+        return paths
+
+# ==============================================================================
+# 增量水網：以並查集 (union-find) 追蹤水格連通，每個水網記錄相鄰田地與水源
+# 放置板塊只處理該 7x7 區塊，活水網與分數可直接查詢
+# ==============================================================================
+NO_SET = frozenset()  # 水網的水源與田地集合不可變：空集合全部共用，複製時也不必逐一複製
+# members / sources / fields 只存有內容的根：單一節點的水網沒有 members 項目 (成員就是自己)，
+# 沒有水源或田地的水網也沒有對應項目，大部分節點只佔 parent 的一格
+
+class WaterNetworkTracker:
+    def __init__(self, rows, cols):
+        self.rows, self.cols = rows, cols
+        self.width = cols * TILE_SIZE
+        self.parent = [-1] * (rows * TILE_SIZE * self.width)  # -1 表示非水格
+        self.members, self.sources, self.fields = {}, {}, {}
+        self.live = set()
+        self.live_log = []  # 依序記錄變成活水的節點；活水只增不減，顯示端只需讀取新增的部分
+        self.scores = [0, 0]
+
+    def copy(self):
+        other = self.__class__.__new__(self.__class__)
+        other.rows, other.cols, other.width = self.rows, self.cols, self.width
+        other.parent = self.parent.copy()
+        other.members = {root: cells[:] for root, cells in self.members.items()}
+        other.sources, other.fields = dict(self.sources), dict(self.fields)
+        other.live = set(self.live)
+        other.live_log = self.live_log[:]
+        other.scores = self.scores[:]
+        return other
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def network_members(self, root): return self.members.get(root, (root,))
+
+    def _contribution(self, root, sign):
+        # 每個田地得到的分數 = 其相鄰水網中的水源數
+        n_sources = len(self.sources.get(root, NO_SET))
+        if not n_sources: return
+        for _, _, owner_id in self.fields.get(root, NO_SET): self.scores[owner_id - 1] += sign * n_sources
+
+    def _union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b: return
+        if len(self.network_members(a)) < len(self.network_members(b)): a, b = b, a
+        sources = self.sources.get(a, NO_SET) | self.sources.get(b, NO_SET)
+        if sources:
+            # 合併後為活水：原本不是活水的一方整個變成活水
+            if a not in self.live: self.live_log.extend(self.network_members(a))
+            if b not in self.live: self.live_log.extend(self.network_members(b))
+        self._contribution(a, -1); self._contribution(b, -1)
+        self.parent[b] = a
+        members = self.members.pop(a, None) or [a]
+        members.extend(self.members.pop(b, (b,)))
+        self.members[a] = members
+        fields = self.fields.pop(a, NO_SET) | self.fields.pop(b, NO_SET)
+        self.sources.pop(b, None)
+        if sources: self.sources[a] = sources
+        if fields: self.fields[a] = fields
+        self.live.discard(b)
+        if sources: self.live.add(a)
+        self._contribution(a, 1)
+
+    def _attach_field(self, i, field):
+        root = self.find(i)
+        fields = self.fields.get(root, NO_SET)
+        if field in fields: return
+        self._contribution(root, -1)
+        self.fields[root] = fields | {field}
+        self._contribution(root, 1)
+
+    def _add_source(self, root, source):
+        self._contribution(root, -1)
+        self.sources[root] = self.sources.get(root, NO_SET) | {source}
+        if root not in self.live: self.live_log.extend(self.network_members(root))
+        self.live.add(root)
+        self._contribution(root, 1)
+
+    def add_tile(self, r, c, tile_type, owner_id, rotation, board):
+        width, parent = self.width, self.parent
+        r0, c0 = r * TILE_SIZE, c * TILE_SIZE
+        if tile_type == FIELD_TILE:
+            field = (r, c, owner_id)
+            for r_cell, c_cell in field_border_cells(r, c, self.rows, self.cols):
+                if parent[r_cell * width + c_cell] != -1: self._attach_field(r_cell * width + c_cell, field)
+            return
+        water = TILE_WATER_CELLS.get(tile_type, ((),) * 4)[rotation]
+        for r_sub, c_sub in water:
+            i = (r0 + r_sub) * width + c0 + c_sub
+            parent[i] = i
+        for r_sub, c_sub in water:
+            i = (r0 + r_sub) * width + c0 + c_sub
+            for dr, dc in NEIGHBOURS:
+                r_next, c_next = r_sub + dr, c_sub + dc
+                if 0 <= r_next < TILE_SIZE and 0 <= c_next < TILE_SIZE:
+                    if parent[i + dr * width + dc] != -1: self._union(i, i + dr * width + dc)
+                    continue
+                # 越過板塊邊界：與鄰格的水相連，或緊鄰田地
+                r_tile, c_tile = r + (r_next // TILE_SIZE), c + (c_next // TILE_SIZE)
+                if not (0 <= r_tile < self.rows and 0 <= c_tile < self.cols) or board.tile_at(r_tile, c_tile) is None: continue
+                neighbour_type, neighbour_owner, _ = board.tile_at(r_tile, c_tile)
+                if neighbour_type == FIELD_TILE: self._attach_field(i, (r_tile, c_tile, neighbour_owner))
+                elif parent[i + dr * width + dc] != -1: self._union(i, i + dr * width + dc)
+        if tile_type == SOURCE_TILE and water:
+            self._add_source(self.find((r0 + water[0][0]) * width + c0 + water[0][1]), (r, c))
+
+    def facing_roots(self, r, c, side, board):
+        # 板塊 (r, c) 第 side 邊外側：相鄰田地 (r, c, owner)，或沿邊 7 格各自所屬水網的根 (None 表示不是水)
+        dr, dc = SIDES[side]
+        r_tile, c_tile = r + dr, c + dc
+        if not (0 <= r_tile < self.rows and 0 <= c_tile < self.cols): return None, None
+        neighbour = board.tile_at(r_tile, c_tile)
+        if neighbour is None: return None, None
+        if neighbour[0] == FIELD_TILE: return (r_tile, c_tile, neighbour[1]), None
+        width, r0, c0 = self.width, r * TILE_SIZE, c * TILE_SIZE
+        if side < 2: cells = [(r0 - 1 if side == 0 else r0 + TILE_SIZE) * width + c0 + k for k in range(TILE_SIZE)]
+        else: cells = [(r0 + k) * width + (c0 - 1 if side == 2 else c0 + TILE_SIZE) for k in range(TILE_SIZE)]
+        return None, tuple(self.find(i) if self.parent[i] != -1 else None for i in cells)
+
+    def network_size(self, root): return len(self.network_members(root))
+
+    def live_networks(self):
+        width = self.width
+        return [{divmod(i, width) for i in self.network_members(root)} for root in self.live]
+
+    def live_cells(self, start=0):
+        # live_log[start:] 的主網格座標，以及下次讀取的起點
+        width = self.width
+        return [divmod(i, width) for i in self.live_log[start:]], len(self.live_log)
+
+# 每種圖樣在每個旋轉下，板塊內部的水網 (區塊內連通分量) 及其在四條邊上的位置
+# 邊的順序為 上、下、左、右；edges[side][k] 為該邊第 k 格所屬分量編號，-1 表示不是水
+SIDES = ((-1, 0), (1, 0), (0, -1), (0, 1))
+OPPOSITE_SIDE = (1, 0, 3, 2)
+
+def _tile_chunk(water_cells):
+    water, components, owner = set(water_cells), [], {}
+    for cell in water_cells:
+        if cell in owner: continue
+        stack, component = [cell], []
+        owner[cell] = len(components)
+        while stack:
+            r_sub, c_sub = stack.pop()
+            component.append((r_sub, c_sub))
+            for dr, dc in NEIGHBOURS:
+                nxt = (r_sub + dr, c_sub + dc)
+                if nxt in water and nxt not in owner: owner[nxt] = len(components); stack.append(nxt)
+        components.append(tuple(sorted(component)))
+    last = TILE_SIZE - 1
+    edges = tuple(tuple(owner.get(cell, -1) for cell in side_cells) for side_cells in (
+        [(0, k) for k in range(TILE_SIZE)], [(last, k) for k in range(TILE_SIZE)],
+        [(k, 0) for k in range(TILE_SIZE)], [(k, last) for k in range(TILE_SIZE)]))
+    return tuple(components), edges
+
+TILE_CHUNKS = {t: tuple(_tile_chunk(cells) for cells in rots) for t, rots in TILE_WATER_CELLS.items()}
+CHUNK_SLOTS = 8  # 單一板塊內分量數的上限，用來編碼節點編號
+
+class ChunkNetworkTracker(WaterNetworkTracker):
+    # 並查集的節點是「板塊內的水網分量」而非單一水格，僅以 dict 保存已放置的板塊
+    def __init__(self, rows, cols):
+        self.rows, self.cols = rows, cols
+        self.width = cols * TILE_SIZE
+        self.parent = {}
+        self.chunks = {}  # 板塊編號 -> tile_type * 4 + rotation (小整數不另外配置物件)
+        self.members, self.sources, self.fields = {}, {}, {}
+        self.live = set()
+        self.live_log = []
+        self.scores = [0, 0]
+
+    def copy(self):
+        other = super().copy()
+        other.chunks = dict(self.chunks)
+        return other
+
+    def _facing(self, r, c, side, board):
+        # 第 side 邊相鄰的板塊 (若存在)
+        dr, dc = SIDES[side]
+        r_tile, c_tile = r + dr, c + dc
+        if not (0 <= r_tile < self.rows and 0 <= c_tile < self.cols): return None, None
+        return (r_tile, c_tile), board.tile_at(r_tile, c_tile)
+
+    def add_tile(self, r, c, tile_type, owner_id, rotation, board):
+        if tile_type == FIELD_TILE:
+            field = (r, c, owner_id)
+            for side in range(4):
+                pos, neighbour = self._facing(r, c, side, board)
+                if neighbour is None or neighbour[0] == FIELD_TILE: continue
+                base = (pos[0] * self.cols + pos[1]) * CHUNK_SLOTS
+                edge = TILE_CHUNKS[neighbour[0]][neighbour[2]][1][OPPOSITE_SIDE[side]]
+                for component in set(edge) - {-1}: self._attach_field(base + component, field)
+            return
+        if tile_type not in TILE_CHUNKS: return
+        components, edges = TILE_CHUNKS[tile_type][rotation]
+        if not components: return
+        index = r * self.cols + c
+        base = index * CHUNK_SLOTS
+        self.chunks[index] = tile_type * 4 + rotation
+        for component in range(len(components)):
+            node = base + component
+            self.parent[node] = node
+        for side in range(4):
+            pos, neighbour = self._facing(r, c, side, board)
+            if neighbour is None: continue
+            if neighbour[0] == FIELD_TILE:
+                for component in set(edges[side]) - {-1}: self._attach_field(base + component, (pos[0], pos[1], neighbour[1]))
+                continue
+            neighbour_base = (pos[0] * self.cols + pos[1]) * CHUNK_SLOTS
+            neighbour_edge = TILE_CHUNKS[neighbour[0]][neighbour[2]][1][OPPOSITE_SIDE[side]]
+            for mine, theirs in zip(edges[side], neighbour_edge):
+                if mine != -1 and theirs != -1: self._union(base + mine, neighbour_base + theirs)
+        if tile_type == SOURCE_TILE:
+            self._add_source(self.find(base), (r, c))
+
+    def facing_roots(self, r, c, side, board):
+        pos, neighbour = self._facing(r, c, side, board)
+        if neighbour is None: return None, None
+        if neighbour[0] == FIELD_TILE: return (pos[0], pos[1], neighbour[1]), None
+        if neighbour[0] not in TILE_CHUNKS: return None, None
+        neighbour_base = (pos[0] * self.cols + pos[1]) * CHUNK_SLOTS
+        neighbour_edge = TILE_CHUNKS[neighbour[0]][neighbour[2]][1][OPPOSITE_SIDE[side]]
+        return None, tuple(self.find(neighbour_base + theirs) if theirs != -1 else None for theirs in neighbour_edge)
+
+    def network_size(self, root):
+        size = 0
+        for node in self.network_members(root):
+            index, component = divmod(node, CHUNK_SLOTS)
+            tile_type, rotation = divmod(self.chunks[index], 4)
+            size += len(TILE_CHUNKS[tile_type][rotation][0][component])
+        return size
+
+    def _node_cells(self, node):
+        index, component = divmod(node, CHUNK_SLOTS)
+        tile_type, rotation = divmod(self.chunks[index], 4)
+        r0, c0 = (index // self.cols) * TILE_SIZE, (index % self.cols) * TILE_SIZE
+        return [(r0 + r_sub, c0 + c_sub) for r_sub, c_sub in TILE_CHUNKS[tile_type][rotation][0][component]]
+
+    def live_networks(self):
+        networks = []
+        for root in self.live:
+            cells = set()
+            for node in self.network_members(root): cells.update(self._node_cells(node))
+            networks.append(cells)
+        return networks
+
+    def live_cells(self, start=0):
+        return [cell for node in self.live_log[start:] for cell in self._node_cells(node)], len(self.live_log)
+
+# ==============================================================================
+# 棋盤：板塊資料 + (rows*7) x (cols*7) 的 uint8 主網格
+# ==============================================================================
+@lru_cache(maxsize=None)
+def tile_data(tile_type, owner_id, rotation):
+    # 板塊資料 (tile_type, owner_id, rotation) 只有幾十種組合，所有棋盤共用同一組 tuple
+    return tile_type, owner_id, rotation
+
+class Board:
+    def __init__(self, rows=BOARD_ROWS, cols=BOARD_COLS):
+        self.rows, self.cols = rows, cols
+        self.tiles = [[None for _ in range(self.cols)] for _ in range(self.rows)]
+        self._init_empty()
+        self.grid = np.zeros((self.rows * TILE_SIZE, self.cols * TILE_SIZE), dtype=np.uint8)
+        self.water = WaterNetworkTracker(self.rows, self.cols)
+
+    def copy(self):
+        other = Board.__new__(Board)
+        other.rows, other.cols = self.rows, self.cols
+        other.tiles = [row[:] for row in self.tiles]
+        other.empty, other.empty_slot = self.empty[:], self.empty_slot[:]
+        other.grid = self.grid.copy()
+        other.water = self.water.copy()
+        return other
+
+    def _init_empty(self):
+        # 空格集合：empty 存格子編號 (r * cols + c)，放置時與最後一個交換後移除；
+        # empty_slot[格子] 為它在 empty 中的位置。兩者都是 uint32 陣列，複製只是記憶體拷貝
+        self.empty = array("I", range(self.rows * self.cols))
+        self.empty_slot = array("I", range(self.rows * self.cols))
+
+    def _take(self, r, c):
+        i = r * self.cols + c
+        slot, empty = self.empty_slot[i], self.empty
+        if slot >= len(empty) or empty[slot] != i: return  # 已被佔用 (覆蓋放置)
+        last = empty.pop()
+        if last != i: empty[slot] = last; self.empty_slot[last] = slot
+
+    def tile_at(self, r, c): return self.tiles[r][c]
+
+    def placed_tiles(self):
+        for r, row in enumerate(self.tiles):
+            for c, tile_data in enumerate(row):
+                if tile_data: yield r, c, tile_data
+
+    def place(self, r, c, tile_type, owner_id, rotation):
+        self.tiles[r][c] = tile_data(tile_type, owner_id, rotation)
+        self._take(r, c)
+        stamp = TILE_STAMPS.get(tile_type, (EMPTY_STAMP,) * 4)[rotation]
+        self.grid[r*TILE_SIZE:(r+1)*TILE_SIZE, c*TILE_SIZE:(c+1)*TILE_SIZE] = stamp
+        if instrument.ENABLED: instrument.count("cells_stamped", TILE_SIZE * TILE_SIZE)
+        self.water.add_tile(r, c, tile_type, owner_id, rotation, self)
+
+    def is_empty(self, r, c): return self.tile_at(r, c) is None
+
+    def is_full(self): return not self.empty
+
+    def empty_cells(self):
+        # 只走訪空格，不掃整個棋盤；順序為放置時交換後的順序
+        cols = self.cols
+        return [divmod(i, cols) for i in self.empty]
+
+    def random_empty_cell(self, rng): return divmod(rng.choice(self.empty), self.cols)
+
+    def fields_and_sources(self):
+        fields_by_player, source_tiles = {1: [], 2: []}, []
+        for r, c, (tile_type, owner_id, _) in sorted(self.placed_tiles()):
+            if tile_type == FIELD_TILE: fields_by_player[owner_id].append((r, c))
+            elif tile_type == SOURCE_TILE: source_tiles.append((r, c))
+        return fields_by_player, source_tiles
+
+    def live_networks(self): return self.water.live_networks()
+
+    def scores(self): return self.water.scores[:]
+
+    def score(self, mode="components"):
+        if mode == "bitboard":
+            from bitboard import BitboardReport  # bitboard 模組依賴本模組，延後匯入
+            return BitboardReport(self)
+        return ScoreReport(self)
+
+    def analyze(self, mode="components"):
+        # mode: "components" (單次標記)、"bitboard" (位元運算)、"bfs" (原始逐田地搜尋)
+        if mode == "bfs": return self.analyze_bfs()
+        report = self.score(mode)
+        return self.grid.tolist(), report.scores, report.paths_by_player, report.fields_by_player, report.source_tiles, report.networks
+
+    def analyze_bfs(self):
+        # 原始做法：每塊田地各自 BFS，逐格比對所有水源板塊
+        master_grid_rows, master_grid_cols = self.grid.shape
+        # 逐格的 BFS 用 list 存取比 numpy 單點索引快得多
+        master_grid = self.grid.tolist()
+        scores, paths_by_player = [0, 0], {1: [], 2: []}
+        fields_by_player, source_tiles = self.fields_and_sources()
+        bfs_nodes = 0
+        for player_id in [1, 2]:
+            player_score = 0
+            for r_field, c_field in fields_by_player[player_id]:
+                q, visited, parent = deque(), set(), {}
+                for cell in field_border_cells(r_field, c_field, self.rows, self.cols):
+                    if master_grid[cell[0]][cell[1]] == 1 and cell not in visited: q.append(cell); visited.add(cell)
+                field_connected_sources_ends = {}
+                while q:
+                    r_curr, c_curr = q.popleft()
+                    current_source_tile = None
+                    for r_source, c_source in source_tiles:
+                        if (r_source*TILE_SIZE <= r_curr < (r_source+1)*TILE_SIZE and c_source*TILE_SIZE <= c_curr < (c_source+1)*TILE_SIZE):
+                            current_source_tile = (r_source, c_source); break
+                    if current_source_tile and current_source_tile not in field_connected_sources_ends: field_connected_sources_ends[current_source_tile] = (r_curr, c_curr)
+                    for dr, dc in NEIGHBOURS:
+                        r_next, c_next = r_curr + dr, c_curr + dc
+                        if not (0 <= r_next < master_grid_rows and 0 <= c_next < master_grid_cols): continue
+                        if (r_next, c_next) in visited or master_grid[r_next][c_next] == 0: continue
+                        visited.add((r_next, c_next)); parent[(r_next, c_next)] = (r_curr, c_curr); q.append((r_next, c_next))
+                for source_coord, end_node in field_connected_sources_ends.items():
+                    path, p_node = [], end_node
+                    while p_node in parent: path.append(p_node); p_node = parent[p_node]
+                    path.append(p_node); path.reverse()
+                    paths_by_player[player_id].append({'field': (r_field, c_field), 'source': source_coord, 'path': path})
+                player_score += len(field_connected_sources_ends)
+                bfs_nodes += len(visited)
+            scores[player_id - 1] = player_score
+        if instrument.ENABLED: instrument.count("bfs_nodes", bfs_nodes)
+        all_networks = find_all_water_networks(master_grid, master_grid_rows, master_grid_cols)
+        return master_grid, scores, paths_by_player, fields_by_player, source_tiles, all_networks
+
+# ==============================================================================
+# 稀疏棋盤：只保存已放置的板塊，水網以板塊為單位 (ChunkNetworkTracker) 追蹤
+# 記憶體與每步成本只隨已放置板塊數成長，適合 20x30 以上的大地圖
+# ==============================================================================
+class SparseBoard(Board):
+    def __init__(self, rows=BOARD_ROWS, cols=BOARD_COLS):
+        self.rows, self.cols = rows, cols
+        self.tiles = {}  # (r, c) -> (tile_type, owner_id, rotation)
+        self._init_empty()
+        self.water = ChunkNetworkTracker(self.rows, self.cols)
+
+    def copy(self):
+        other = SparseBoard.__new__(SparseBoard)
+        other.rows, other.cols = self.rows, self.cols
+        other.tiles = dict(self.tiles)
+        other.empty, other.empty_slot = self.empty[:], self.empty_slot[:]
+        other.water = self.water.copy()
+        return other
+
+    @property
+    def grid(self):
+        # 只在需要完整主網格時 (結果畫面、逐格分析) 才展開
+        grid = np.zeros((self.rows * TILE_SIZE, self.cols * TILE_SIZE), dtype=np.uint8)
+        for (r, c), (tile_type, _, rotation) in self.tiles.items():
+            grid[r*TILE_SIZE:(r+1)*TILE_SIZE, c*TILE_SIZE:(c+1)*TILE_SIZE] = TILE_STAMPS.get(tile_type, (EMPTY_STAMP,) * 4)[rotation]
+        if instrument.ENABLED: instrument.count("cells_stamped", len(self.tiles) * TILE_SIZE * TILE_SIZE)
+        return grid
+
+    def tile_at(self, r, c): return self.tiles.get((r, c))
+
+    def placed_tiles(self):
+        for (r, c), tile_data in self.tiles.items(): yield r, c, tile_data
+
+    def place(self, r, c, tile_type, owner_id, rotation):
+        self.tiles[(r, c)] = tile_data(tile_type, owner_id, rotation)
+        self._take(r, c)
+        self.water.add_tile(r, c, tile_type, owner_id, rotation, self)
+
+# ==============================================================================
+# 遊戲流程：設置田地 -> 輪流擲骰放置板塊 -> 棋盤填滿後結束
+# ==============================================================================
+def valid_board_size(rows, cols): return rows >= 1 and cols >= 1 and rows * cols >= MIN_BOARD_TILES
+
+class GameState:
+    def __init__(self, rng=None, rows=BOARD_ROWS, cols=BOARD_COLS, sparse=False):
+        if not valid_board_size(rows, cols): raise ValueError(f"棋盤尺寸不合法: {rows}x{cols} (至少 {MIN_BOARD_TILES} 格)")
+        self.board = (SparseBoard if sparse else Board)(rows, cols)
+        self.rng = rng if rng is not None else random.Random()
+        self.current_player_index = 0
+        self.game_phase = "SETUP"
+        self.current_drawn_tile = None
+        self.current_rotation = 0
+        # 每步放置後呼叫 listener(game, move)，用於紀錄對局等
+        self.listeners = []
+
+    def copy(self):
+        other = GameState.__new__(GameState)
+        other.__dict__.update(self.__dict__)
+        other.board = self.board.copy()
+        other.listeners = []
+        return other
+
+    @property
+    def player_id(self): return self.current_player_index + 1
+
+    def start_turn(self):
+        self.current_drawn_tile = self.rng.randint(1, 6)
+        self.current_rotation = 0
+        return self.current_drawn_tile
+
+    def can_rotate(self): return self.current_drawn_tile is not None and self.current_drawn_tile not in FIXED_TILES
+
+    def rotate(self):
+        if not self.can_rotate(): return False
+        self.current_rotation = (self.current_rotation + 1) % 4
+        return True
+
+    def pending_tile(self):
+        # 目前玩家這一步要放的 (板塊, 擁有者, 旋轉)
+        if self.game_phase == "SETUP": return FIELD_TILE, self.player_id, 0
+        if self.game_phase == "PLAYING" and self.current_drawn_tile is not None:
+            tile_type = self.current_drawn_tile
+            return tile_type, (self.player_id if tile_type == FIELD_TILE else None), self.current_rotation
+        return None
+
+    def play(self, r, c, rotation=None):
+        pending = self.pending_tile()
+        if pending is None or not self.board.is_empty(r, c): return None
+        tile_type, owner_id, current_rotation = pending
+        if rotation is None or tile_type in FIXED_TILES: rotation = current_rotation
+        self.board.place(r, c, tile_type, owner_id, rotation)
+        if self.game_phase == "SETUP":
+            if self.board.is_full(): self.game_phase = "ENDED"
+            elif self.current_player_index == 0: self.current_player_index = 1
+            else:
+                self.game_phase = "PLAYING"
+                self.current_player_index = 0
+                self.start_turn()
+        else:
+            self.current_drawn_tile = None
+            self.current_rotation = 0
+            if self.board.is_full(): self.game_phase = "ENDED"
+            else:
+                self.current_player_index = 1 - self.current_player_index
+                self.start_turn()
+        move = (r, c, tile_type, owner_id, rotation)
+        for listener in self.listeners: listener(self, move)
+        return move
+
+    def scores(self): return self.board.scores()
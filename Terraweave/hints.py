@@ -0,0 +1,93 @@
+from engine import TILE_CHUNKS, DISTINCT_ROTATIONS, FIELD_TILE, SOURCE_TILE, NO_SET
+
+# ==============================================================================
+# 落子提示：對抽到的板塊一次評估所有空格 x 所有不同旋轉
+# 不複製棋盤也不重算：每個空格只查一次四邊外側相鄰的水網根 (各旋轉共用)，
+# 再依板塊內的分量與邊界位置，算出合併後的水網分數與新增活水格數
+# 結果為 (r, c, rotation, scores, live_cells) 的串列，順序為空格順序 x 旋轉順序
+# ==============================================================================
+
+def _owner_counts(fields):
+    counts = [0, 0]
+    for _, _, owner_id in fields: counts[owner_id - 1] += 1
+    return counts
+
+def _field_scores(tracker, facing, field, scores):
+    # 田地：外側每個相鄰水網的水源數都加給擁有者
+    scores = scores[:]
+    for root in {root for _, side_roots in facing if side_roots for root in side_roots if root is not None}:
+        scores[field[2] - 1] += len(tracker.sources.get(root, NO_SET))
+    return scores
+
+def _tile_scores(tracker, facing, r, c, tile_type, rotation, scores):
+    components, edges = TILE_CHUNKS[tile_type][rotation]
+    scores = scores[:]
+    if not components: return scores, 0
+    # 板塊內各分量接觸到的既有水網與田地
+    touched_roots = [set() for _ in components]
+    touched_fields = [set() for _ in components]
+    for side, (field, side_roots) in enumerate(facing):
+        for k, component in enumerate(edges[side]):
+            if component == -1: continue
+            if field: touched_fields[component].add(field)
+            elif side_roots and side_roots[k] is not None: touched_roots[component].add(side_roots[k])
+    # 接到同一個既有水網的分量放完後會合併成一個水網
+    group = list(range(len(components)))
+    def find(k):
+        while group[k] != k: k = group[k]
+        return k
+    first_component = {}
+    for k, roots in enumerate(touched_roots):
+        for root in roots:
+            if root in first_component: group[find(k)] = find(first_component[root])
+            else: first_component[root] = k
+    groups = {}
+    for k in range(len(components)): groups.setdefault(find(k), []).append(k)
+    live_cells = 0
+    for members in groups.values():
+        roots = set().union(*(touched_roots[k] for k in members))
+        fields = set().union(*(touched_fields[k] for k in members))
+        sources = set()
+        for root in roots:
+            root_sources, root_fields = tracker.sources.get(root, NO_SET), tracker.fields.get(root, NO_SET)
+            for i, n in enumerate(_owner_counts(root_fields)): scores[i] -= n * len(root_sources)
+            fields |= root_fields
+            sources |= root_sources
+        if tile_type == SOURCE_TILE and 0 in members: sources.add((r, c))
+        if not sources: continue
+        for i, n in enumerate(_owner_counts(fields)): scores[i] += n * len(sources)
+        live_cells += sum(len(components[k]) for k in members)
+        live_cells += sum(tracker.network_size(root) for root in roots if root not in tracker.live)
+    return scores, live_cells
+
+def evaluate_moves(board, tile_type, owner_id=None, rotations=None):
+    tracker = board.water
+    scores = tracker.scores
+    rotations = DISTINCT_ROTATIONS[tile_type] if rotations is None else rotations
+    results = []
+    for r, c in board.empty_cells():
+        facing = [tracker.facing_roots(r, c, side, board) for side in range(4)]
+        if tile_type == FIELD_TILE:
+            field_scores = _field_scores(tracker, facing, (r, c, owner_id), scores)
+            results.extend((r, c, rotation, field_scores, 0) for rotation in rotations)
+            continue
+        for rotation in rotations:
+            results.append((r, c, rotation, *_tile_scores(tracker, facing, r, c, tile_type, rotation, scores)))
+    return results
+
+def evaluate_game(game):
+    # 目前玩家手上的板塊；沒有待放置的板塊時回傳空串列
+    pending = game.pending_tile()
+    if pending is None: return []
+    tile_type, owner_id, _ = pending
+    return evaluate_moves(game.board, tile_type, owner_id)
+
+def move_value(hint, player_index):
+    # 以 (自己分數 - 對手分數) 排名，新增活水格數次之
+    _, _, _, scores, live_cells = hint
+    return scores[player_index] - scores[1 - player_index], live_cells
+
+def best_moves(hints, player_index):
+    if not hints: return []
+    best = max(move_value(hint, player_index) for hint in hints)
+    return [hint for hint in hints if move_value(hint, player_index) == best]
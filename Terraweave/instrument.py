@@ -0,0 +1,100 @@
+import functools
+import json
+import time
+
+# ==============================================================================
+# 回合流程的計時與計數 (預設關閉)
+# 關閉時 timed() 包裝只多一次旗標檢查，引擎內的計數點也都先檢查 ENABLED 再呼叫 count()
+#
+# 最外層的 stage 開始到結束算一筆紀錄 (例如一次點擊 on_board_click 的完整處理)：
+#   {"root": 名稱, "start_ms": 距 reset() 的時間, "total_ms": 總耗時,
+#    "stages": {階段: 累計毫秒 (含巢狀)}, "counters": {計數器: 數量}}
+# 只在主執行緒 (Tk 迴圈) 使用；其他執行緒的計數會算進當時進行中的紀錄
+# ==============================================================================
+ENABLED = False
+listeners = []  # 每筆紀錄完成時呼叫 listener(record)，例如畫面上的除錯資訊
+
+_clock = time.perf_counter
+_epoch = _clock()
+_depth = 0
+_current = None
+_records = []
+_stage_totals = {}    # 階段 -> [呼叫次數, 累計秒數, 最長秒數]
+_counter_totals = {}
+_meta = {}
+
+def enable():
+    global ENABLED
+    ENABLED = True
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+def reset(**meta):
+    # 開始新的一局：清空紀錄，meta 會隨匯出的追蹤一起寫出
+    global _epoch, _depth, _current
+    _epoch, _depth, _current = _clock(), 0, None
+    _records.clear(); _stage_totals.clear(); _counter_totals.clear()
+    _meta.clear(); _meta.update(meta, started=time.strftime("%Y-%m-%dT%H:%M:%S"))
+
+class stage:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name): self.name = name
+
+    def __enter__(self):
+        global _depth, _current
+        if _depth == 0: _current = {"root": self.name, "start_ms": round((_clock() - _epoch) * 1e3, 3), "total_ms": 0.0, "stages": {}, "counters": {}}
+        _depth += 1
+        self.started = _clock()
+        return self
+
+    def __exit__(self, *exc):
+        global _depth, _current
+        elapsed = _clock() - self.started
+        _depth = max(_depth - 1, 0)
+        record = _current
+        if record is None: return False  # 進行中被 reset()
+        stages = record["stages"]
+        stages[self.name] = round(stages.get(self.name, 0.0) + elapsed * 1e3, 3)
+        totals = _stage_totals.setdefault(self.name, [0, 0.0, 0.0])
+        totals[0] += 1; totals[1] += elapsed; totals[2] = max(totals[2], elapsed)
+        if _depth == 0:
+            record["total_ms"] = round(elapsed * 1e3, 3)
+            _records.append(record)
+            _current = None
+            for listener in listeners: listener(record)
+        return False
+
+def timed(name=None):
+    # 方法/函式裝飾器；關閉時直接呼叫原函式
+    def decorate(func):
+        label = name or func.__name__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED: return func(*args, **kwargs)
+            with stage(label): return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def count(name, n=1):
+    if _current is not None:
+        counters = _current["counters"]
+        counters[name] = counters.get(name, 0) + n
+    _counter_totals[name] = _counter_totals.get(name, 0) + n
+
+def records(): return list(_records)
+
+def slowest(n=5): return sorted(_records, key=lambda record: record["total_ms"], reverse=True)[:n]
+
+def summary():
+    stages = {name: {"calls": calls, "total_ms": round(total * 1e3, 3), "mean_ms": round(total * 1e3 / calls, 3), "max_ms": round(longest * 1e3, 3)}
+              for name, (calls, total, longest) in _stage_totals.items()}
+    return {"records": len(_records), "stages": stages, "counters": dict(_counter_totals)}
+
+def export(path, **meta):
+    # 一局一行 JSON，附加到檔案後面
+    trace = {"meta": dict(_meta, **meta), "summary": summary(), "records": _records}
+    with open(path, "a", encoding="utf-8") as f: f.write(json.dumps(trace, ensure_ascii=False) + "\n")
+    return trace
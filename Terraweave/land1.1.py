@@ -1,354 +1,483 @@
-import tkinter as tk
-from tkinter import ttk
-from tkinter import messagebox
-from PIL import Image, ImageTk
-import random
-import os
-from collections import deque
-
-# ==============================================================================
-# 核心美術與邏輯定義 (微調參數)
-# ==============================================================================
-TILE_PATTERNS = {
-    1: [[1,1,1,1,1,1,1], [1,0,0,0,0,0,1], [1,0,0,0,0,0,1], [1,0,0,0,0,0,1], [1,0,0,0,0,0,1], [1,0,0,0,0,0,1], [1,1,1,1,1,1,1]],
-    2: [[0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [1,1,1,1,1,1,1], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0]],
-    3: [[1,1,0,0,0,0,0], [1,1,1,0,0,0,0], [0,1,1,1,0,0,0], [0,0,1,1,1,0,0], [0,0,0,1,1,1,0], [0,0,0,0,1,1,1], [0,0,0,0,0,1,1]],
-    4: [[0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0]],
-    5: [[1,1,0,0,0,1,1], [1,1,1,0,1,1,1], [0,1,1,1,1,1,0], [0,0,1,1,1,0,0], [0,1,1,1,1,1,0], [1,1,1,0,1,1,1], [1,1,0,0,0,1,1]],
-    6: [[0,0,0,0,0,0,0], [1,1,1,1,1,1,1], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [0,0,0,0,0,0,0], [1,1,1,1,1,1,1], [0,0,0,0,0,0,0]],
-}
-
-class RiverGameGUI:
-    def __init__(self, master):
-        self.master = master
-        self.master.title("河流農場")
-        self.master.resizable(False, False)
-
-        self.board_data = [[None for _ in range(6)] for _ in range(4)]
-        self.players = ["玩家1", "玩家2"]
-        
-        self.player_border_colors = {1: "#ffc0cb", 2: "#90ee90"}
-        self.player_path_colors = {1: "#d90429", 2: "#006400"}
-        self.water_color = "#00BFFF"
-        
-        self.current_player_index = 0
-        self.game_phase = "SETUP"
-        self.current_drawn_tile = None
-        self.current_rotation = 0
-        
-        self.base_images = {}
-        self.photo_images_cache = {}
-        self.dice_images = {}
-
-        try:
-            self.main_frame = tk.Frame(self.master, bg="lightgrey", padx=5, pady=5)
-            self.main_frame.pack(expand=True, fill="both")
-            self.load_images()
-            self.create_widgets()
-            self.start_initial_setup()
-        except Exception as e:
-            messagebox.showerror("啟動錯誤", f"無法啟動遊戲: {e}")
-            self.master.destroy()
-
-    def load_images(self):
-        self.tile_pixel_size = 80
-        for i in range(1, 7):
-            filepath = os.path.join(os.path.dirname(__file__), f"{i}.png")
-            if not os.path.exists(filepath): raise FileNotFoundError(f"板塊圖片遺失: {i}.png")
-            img = Image.open(filepath).resize((self.tile_pixel_size, self.tile_pixel_size), Image.LANCZOS)
-            self.base_images[i] = img
-        
-        dice_image_size = (40, 40)
-        num_to_word = {1: 'one', 2: 'two', 3: 'three', 4: 'four', 5: 'five', 6: 'six'}
-        for i in range(1, 7):
-            filename = f"dice-six-faces-{num_to_word[i]}.png"
-            filepath = os.path.join(os.path.dirname(__file__), filename)
-            if not os.path.exists(filepath): raise FileNotFoundError(f"骰子圖片遺失: {filename}")
-            img = Image.open(filepath).resize(dice_image_size, Image.LANCZOS)
-            self.dice_images[i] = ImageTk.PhotoImage(img)
-        blank_dice_img = Image.new('RGBA', dice_image_size, (0,0,0,0))
-        self.dice_blank_image = ImageTk.PhotoImage(blank_dice_img)
-
-    def get_rotated_image(self, tile_type, rotation_state):
-        angle = -90 * rotation_state
-        cache_key = (tile_type, rotation_state)
-        if cache_key not in self.photo_images_cache:
-            base_img = self.base_images[tile_type]
-            rotated_img = base_img.rotate(angle)
-            self.photo_images_cache[cache_key] = ImageTk.PhotoImage(rotated_img)
-        return self.photo_images_cache[cache_key]
-
-    def create_widgets(self):
-        status_frame = tk.Frame(self.main_frame, padx=10, pady=10)
-        status_frame.pack(fill="x")
-        self.status_label = tk.Label(status_frame, text="準備開始...", font=("Arial", 14), width=35, anchor="w")
-        self.status_label.pack(side="left", expand=True, fill="x")
-        self.current_tile_button = tk.Button(status_frame, relief="sunken", state="disabled", command=self.rotate_current_tile)
-        self.current_tile_button.pack(side="left", padx=10)
-        self.dice_text_label = tk.Label(status_frame, text="骰子:", font=("Arial", 14))
-        self.dice_text_label.pack(side="left")
-        self.dice_image_label = tk.Label(status_frame)
-        self.dice_image_label.pack(side="left", padx=(5,0))
-
-        board_width = 6 * self.tile_pixel_size
-        board_height = 4 * self.tile_pixel_size
-        self.board_canvas = tk.Canvas(self.main_frame, width=board_width, height=board_height, bg="white")
-        self.board_canvas.pack(pady=10)
-        self.board_canvas.bind("<Button-1>", self.on_canvas_click)
-        self.draw_grid_lines()
-
-    def draw_grid_lines(self):
-        board_width = 6 * self.tile_pixel_size
-        board_height = 4 * self.tile_pixel_size
-        for i in range(1, 6): self.board_canvas.create_line(i * self.tile_pixel_size, 0, i * self.tile_pixel_size, board_height, fill="lightgrey")
-        for i in range(1, 4): self.board_canvas.create_line(0, i * self.tile_pixel_size, board_width, i * self.tile_pixel_size, fill="lightgrey")
-
-    def on_canvas_click(self, event):
-        col = event.x // self.tile_pixel_size
-        row = event.y // self.tile_pixel_size
-        if 0 <= col < 6 and 0 <= row < 4:
-            self.on_board_click(row, col)
-
-    def update_border_color(self):
-        player_id = self.current_player_index + 1
-        color = self.player_border_colors.get(player_id, "lightgrey")
-        self.main_frame.config(bg=color)
-
-    def start_initial_setup(self):
-        self.game_phase = "SETUP"
-        self.current_player_index = 0
-        self.update_border_color()
-        self.update_status_label()
-
-    def on_board_click(self, r, c):
-        if self.board_data[r][c] is not None: return
-        if self.game_phase == "SETUP":
-            player_id = self.current_player_index + 1
-            self.place_tile_on_board(r, c, 4, player_id, 0)
-            if self.current_player_index == 0:
-                self.current_player_index = 1
-                self.update_border_color()
-                self.update_status_label()
-            else:
-                self.game_phase = "PLAYING"
-                self.current_player_index = 0
-                self.start_player_turn()
-        elif self.game_phase == "PLAYING":
-            if self.current_drawn_tile is None: return
-            player_id = self.current_player_index + 1
-            tile_type = self.current_drawn_tile
-            owner = player_id if tile_type == 4 else None
-            self.place_tile_on_board(r, c, tile_type, owner, self.current_rotation)
-            self.current_drawn_tile = None
-            self.current_rotation = 0
-            self.dice_image_label.config(image=self.dice_blank_image)
-            self.current_tile_button.config(state="disabled")
-            if self.is_board_full(): self.end_game(); return
-            self.current_player_index = 1 - self.current_player_index
-            self.start_player_turn()
-            
-    def place_tile_on_board(self, r, c, tile_type, owner_id, rotation):
-        self.board_data[r][c] = (tile_type, owner_id, rotation)
-        photo_image = self.get_rotated_image(tile_type, rotation)
-        x = c * self.tile_pixel_size + self.tile_pixel_size / 2
-        y = r * self.tile_pixel_size + self.tile_pixel_size / 2
-        self.board_canvas.create_image(x, y, image=photo_image, anchor="center")
-        if owner_id:
-             x1, y1 = c * self.tile_pixel_size, r * self.tile_pixel_size
-             self.board_canvas.create_rectangle(x1+2, y1+2, x1+self.tile_pixel_size-2, y1+self.tile_pixel_size-2, outline=self.player_border_colors[owner_id], width=3)
-        self.update_water_networks_display()
-
-    def start_player_turn(self):
-        self.update_border_color()
-        rolled_number = random.randint(1, 6)
-        self.current_drawn_tile = rolled_number
-        self.current_rotation = 0
-        self.dice_image_label.config(image=self.dice_images[rolled_number])
-        rotated_image = self.get_rotated_image(self.current_drawn_tile, self.current_rotation)
-        self.current_tile_button.config(image=rotated_image, state="normal")
-        if self.current_drawn_tile in [1, 4, 5]: self.current_tile_button.config(state="disabled")
-        self.update_status_label()
-    
-    def rotate_current_tile(self):
-        if self.current_drawn_tile in [1, 4, 5]: return
-        self.current_rotation = (self.current_rotation + 1) % 4
-        rotated_image = self.get_rotated_image(self.current_drawn_tile, self.current_rotation)
-        self.current_tile_button.config(image=rotated_image)
-
-    def update_status_label(self):
-        player = self.players[self.current_player_index]
-        if self.game_phase == "SETUP": self.status_label['text'] = f"輪到 {player}：請在地圖上放置你的田地(4)。"
-        elif self.game_phase == "PLAYING": self.status_label['text'] = f"輪到 {player}：請放置板塊 {self.current_drawn_tile}。"
-
-    def update_water_networks_display(self):
-        self.board_canvas.delete("water_overlay")
-        master_grid, _, _, _, source_tiles, all_networks = self.build_and_analyze_grid()
-        live_networks = set()
-        for i, network in enumerate(all_networks):
-            for r_source, c_source in source_tiles:
-                if (r_source * 7, c_source * 7) in network:
-                    live_networks.add(i); break
-        cell_size = self.tile_pixel_size // 7
-        for i in live_networks:
-            for r, c in all_networks[i]:
-                x1, y1 = c * cell_size, r * cell_size
-                #self.board_canvas.create_rectangle(x1, y1, x1+cell_size, y1+cell_size, fill=self.water_color, stipple="gray50", outline="", tags="water_overlay")
-
-    def is_board_full(self): return all(all(cell is not None for cell in row) for row in self.board_data)
-    
-    def end_game(self):
-        self.status_label['text'] = "遊戲結束！正在計算分數..."
-        self.main_frame.config(bg="lightgrey")
-        self.master.update_idletasks()
-        master_grid, scores, paths, fields, source_tiles, _ = self.build_and_analyze_grid()
-        self.display_results_window(master_grid, paths, fields, source_tiles)
-        result_text = f"遊戲結束！\n\n最終得分：\n玩家1: {scores[0]} 分\n玩家2: {scores[1]} 分\n\n"
-        if scores[0] > scores[1]: result_text += "玩家1 獲勝！"
-        elif scores[1] > scores[0]: result_text += "玩家2 獲勝！"
-        else: result_text += "平手！"
-        messagebox.showinfo("遊戲結束", result_text)
-        self.current_tile_button.config(state="disabled")
-
-    def rotate_matrix(self, matrix):
-        return [list(row)[::-1] for row in zip(*matrix)]
-
-    def display_results_window(self, master_grid, paths_by_player, fields_by_player, source_tiles):
-        result_window = tk.Toplevel(self.master)
-        result_window.title("最終結果路線圖")
-        notebook = ttk.Notebook(result_window)
-        notebook.pack(pady=10, padx=10, expand=True, fill="both")
-        for player_id in [1, 2]:
-            player_frame = ttk.Frame(notebook, padding="10")
-            notebook.add(player_frame, text=f"玩家 {player_id} 的得分路徑")
-            list_frame = tk.Frame(player_frame); list_frame.pack(side="left", fill="y", padx=(0, 10))
-            tk.Label(list_frame, text="選擇要檢視的路徑:").pack()
-            path_listbox = tk.Listbox(list_frame, selectmode="browse", height=20, width=35); path_listbox.pack(fill="y")
-            canvas_frame = tk.Frame(player_frame); canvas_frame.pack(side="right", expand=True, fill="both")
-            cell_size = 10
-            rows, cols = len(master_grid), len(master_grid[0])
-            canvas = tk.Canvas(canvas_frame, width=cols*cell_size, height=rows*cell_size, bg="white"); canvas.pack()
-            for r in range(rows):
-                for c in range(cols):
-                    if master_grid[r][c] == 1:
-                        x1, y1, x2, y2 = c*cell_size, r*cell_size, (c+1)*cell_size, (r+1)*cell_size
-                        canvas.create_rectangle(x1, y1, x2, y2, fill="lightgrey", outline="")
-            for pid, fields in fields_by_player.items():
-                for r_field, c_field in fields:
-                    x1, y1, x2, y2 = c_field*7*cell_size, r_field*7*cell_size, (c_field+1)*7*cell_size, (r_field+1)*7*cell_size
-                    canvas.create_rectangle(x1, y1, x2, y2, outline=self.player_border_colors[pid], width=3)
-            for r_source, c_source in source_tiles:
-                center_x, center_y = (c_source*7 + 3.5)*cell_size, (r_source*7 + 3.5)*cell_size
-                radius = 2.5 * cell_size
-                canvas.create_oval(center_x-radius, center_y-radius, center_x+radius, center_y+radius, fill="#4682b4", outline="")
-            player_paths = paths_by_player.get(player_id, [])
-            for i, path_data in enumerate(player_paths):
-                path_listbox.insert(tk.END, f"路線 {i+1}: 田地{path_data['field']} -> 水源{path_data['source']}")
-            def on_path_select(event, pl_id=player_id, pl_paths=player_paths, cv=canvas):
-                cv.delete("current_path")
-                selection_indices = event.widget.curselection()
-                if not selection_indices: return
-                selected_path_data = pl_paths[selection_indices[0]]
-                path, path_color = selected_path_data['path'], self.player_path_colors[pl_id]
-                r_field, c_field = selected_path_data['field']
-                field_center_x, field_center_y = (c_field*7 + 3.5)*cell_size, (r_field*7 + 3.5)*cell_size
-                if path:
-                    pixel_path = [(c*cell_size + cell_size/2, r*cell_size + cell_size/2) for r, c in path]
-                    start_of_path_x, start_of_path_y = pixel_path[0]
-                    cv.create_line(field_center_x, field_center_y, start_of_path_x, start_of_path_y, fill=path_color, width=3, tags="current_path")
-                    if len(path) > 1: cv.create_line(pixel_path, fill=path_color, width=3, tags="current_path")
-            path_listbox.bind("<<ListboxSelect>>", on_path_select)
-            
-    def find_all_water_networks(self, master_grid, rows, cols):
-        visited, networks = set(), []
-        for r in range(rows):
-            for c in range(cols):
-                if master_grid[r][c] == 1 and (r, c) not in visited:
-                    current_network, q = set(), deque([(r, c)])
-                    visited.add((r, c))
-                    while q:
-                        curr_r, curr_c = q.popleft()
-                        current_network.add((curr_r, curr_c))
-                        for dr, dc in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
-                            next_r, next_c = curr_r + dr, curr_c + dc
-                            if 0 <= next_r < rows and 0 <= next_c < cols and \
-                               master_grid[next_r][next_c] == 1 and (next_r, next_c) not in visited:
-                                visited.add((next_r, next_c)); q.append((next_r, next_c))
-                    networks.append(current_network)
-        return networks
-
-    def build_and_analyze_grid(self):
-        master_grid_rows, master_grid_cols = 4 * 7, 6 * 7
-        master_grid = [[0] * master_grid_cols for _ in range(master_grid_rows)]
-        for r_tile in range(4):
-            for c_tile in range(6):
-                tile_data = self.board_data[r_tile][c_tile]
-                if tile_data:
-                    tile_type, _, rotation = tile_data
-                    pattern = TILE_PATTERNS.get(tile_type, [[0]*7]*7)
-                    for _ in range(rotation): pattern = self.rotate_matrix(pattern)
-                    for r_sub in range(7):
-                        for c_sub in range(7): master_grid[r_tile*7+r_sub][c_tile*7+c_sub] = pattern[r_sub][c_sub]
-        scores, paths_by_player, fields_by_player, source_tiles = [0, 0], {1: [], 2: []}, {1: [], 2: []}, []
-        for r in range(4):
-            for c in range(6):
-                if self.board_data[r][c]:
-                    tile_type, owner_id, _ = self.board_data[r][c]
-                    if tile_type == 4: fields_by_player[owner_id].append((r, c))
-                    elif tile_type == 1: source_tiles.append((r, c))
-        for player_id in [1, 2]:
-            player_score = 0
-            for r_field, c_field in fields_by_player[player_id]:
-                q, visited, parent = deque(), set(), {}
-                r_start_abs, c_start_abs = r_field*7, c_field*7
-                # *** 核心修正點：嚴格檢查四條邊界，禁止對角線跳躍 ***
-                # 上邊界
-                if r_field > 0:
-                    for c_offset in range(7):
-                        r_check, c_check = r_start_abs - 1, c_start_abs + c_offset
-                        if master_grid[r_check][c_check] == 1:
-                            if (r_check, c_check) not in visited: q.append((r_check, c_check)); visited.add((r_check, c_check))
-                # 下邊界
-                if r_field < 3:
-                    for c_offset in range(7):
-                        r_check, c_check = r_start_abs + 7, c_start_abs + c_offset
-                        if master_grid[r_check][c_check] == 1:
-                            if (r_check, c_check) not in visited: q.append((r_check, c_check)); visited.add((r_check, c_check))
-                # 左邊界
-                if c_field > 0:
-                    for r_offset in range(7):
-                        r_check, c_check = r_start_abs + r_offset, c_start_abs - 1
-                        if master_grid[r_check][c_check] == 1:
-                            if (r_check, c_check) not in visited: q.append((r_check, c_check)); visited.add((r_check, c_check))
-                # 右邊界
-                if c_field < 5:
-                    for r_offset in range(7):
-                        r_check, c_check = r_start_abs + r_offset, c_start_abs + 7
-                        if master_grid[r_check][c_check] == 1:
-                            if (r_check, c_check) not in visited: q.append((r_check, c_check)); visited.add((r_check, c_check))
-
-                field_connected_sources_ends = {}
-                while q:
-                    r_curr, c_curr = q.popleft()
-                    current_source_tile = None
-                    for r_source, c_source in source_tiles:
-                        if (r_source*7 <= r_curr < (r_source+1)*7 and c_source*7 <= c_curr < (c_source+1)*7): current_source_tile = (r_source, c_source); break
-                    if current_source_tile and current_source_tile not in field_connected_sources_ends: field_connected_sources_ends[current_source_tile] = (r_curr, c_curr)
-                    for dr, dc in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
-                        r_next, c_next = r_curr + dr, c_curr + dc
-                        if not (0 <= r_next < master_grid_rows and 0 <= c_next < master_grid_cols): continue
-                        if (r_next, c_next) in visited or master_grid[r_next][c_next] == 0: continue
-                        visited.add((r_next, c_next)); parent[(r_next, c_next)] = (r_curr, c_curr); q.append((r_next, c_next))
-                for source_coord, end_node in field_connected_sources_ends.items():
-                    path, p_node = [], end_node
-                    while p_node in parent: path.append(p_node); p_node = parent[p_node]
-                    path.append(p_node); path.reverse()
-                    paths_by_player[player_id].append({'field': (r_field, c_field), 'source': source_coord, 'path': path})
-                player_score += len(field_connected_sources_ends)
-            scores[player_id - 1] = player_score
-        all_networks = self.find_all_water_networks(master_grid, master_grid_rows, master_grid_cols)
-        return master_grid, scores, paths_by_player, fields_by_player, source_tiles, all_networks
-
-if __name__ == "__main__":
-    root = tk.Tk()
-    app = RiverGameGUI(root)
+import tkinter as tk
+from tkinter import ttk
+from tkinter import messagebox
+from PIL import Image, ImageTk
+import argparse
+import struct
+
+from engine import GameState, BOARD_ROWS, BOARD_COLS, MIN_BOARD_TILES, valid_board_size
+from ai import ExpectimaxAI
+from render import BoardRaster, fit_tile_pixel_size, render_results_image
+from atlas import SpriteAtlas
+from record import GameRecorder, CorpusWriter
+from hints import evaluate_game, best_moves
+import instrument
+
+def _counted(create):
+    def create_item(self, *args, **kw):
+        if instrument.ENABLED: instrument.count("canvas_items")
+        return create(self, *args, **kw)
+    return create_item
+
+class CountingCanvas(tk.Canvas):
+    # 計算建立的畫布項目數：包裝每個公開的 create_* 方法，不覆寫 tkinter 內部的 Canvas._create
+    create_arc = _counted(tk.Canvas.create_arc)
+    create_bitmap = _counted(tk.Canvas.create_bitmap)
+    create_image = _counted(tk.Canvas.create_image)
+    create_line = _counted(tk.Canvas.create_line)
+    create_oval = _counted(tk.Canvas.create_oval)
+    create_polygon = _counted(tk.Canvas.create_polygon)
+    create_rectangle = _counted(tk.Canvas.create_rectangle)
+    create_text = _counted(tk.Canvas.create_text)
+    create_window = _counted(tk.Canvas.create_window)
+
+AI_PENDING = object()  # 電腦仍在背景搜尋 (與任何落子結果都不同)
+
+class RiverGameGUI:
+    def __init__(self, master, ai_player=None, ai_time_budget=1.0, rows=BOARD_ROWS, cols=BOARD_COLS, sparse=False, tile_pixel_size=80, render_mode="raster", record_path=None, show_hints=False, server_address=None, debug_overlay=False, trace_path=None):
+        self.master = master
+        self.master.title("河流農場")
+        self.master.resizable(False, False)
+
+        # 所有規則與狀態都在引擎中，GUI 只負責顯示與輸入
+        self.game = GameState(rows=rows, cols=cols, sparse=sparse)
+        # 指定對局庫檔案時，終局後把這一局的棋譜附加進去
+        self.record_path = record_path
+        self.recorder = GameRecorder(self.game) if record_path else None
+        self.tile_pixel_size = fit_tile_pixel_size(rows, cols, tile_pixel_size)
+        # "raster"：整個棋盤合成為單一影像並只更新變動區域；"canvas"：每個板塊一個畫布項目
+        self.render_mode = render_mode
+        self.raster = None
+        self.players = ["玩家1", "玩家2"]
+        # 由電腦操作的玩家編號 (1 或 2)，None 表示兩位玩家都在同一個畫面操作
+        self.ai_player = ai_player
+        self.ai = ExpectimaxAI(time_budget=ai_time_budget) if ai_player else None
+        self.ai_result = AI_PENDING
+        # 提示模式：擲骰後在棋盤上標出最佳落點
+        self.show_hints = show_hints
+        # 連線對戰：擲骰與合法性由伺服器決定，本地的 GameState 只跟著伺服器的訊息更新
+        # 連線在下方的 try 中建立，連不上伺服器時與其他啟動錯誤一樣顯示對話框
+        self.client = None
+        self.seat = None
+        # 效能追蹤：畫面上的除錯資訊與每局追蹤檔，任一開啟時才啟用計時
+        self.debug_overlay = debug_overlay
+        self.trace_path = trace_path
+        if debug_overlay or trace_path: instrument.enable()
+        instrument.reset(rows=rows, cols=cols, render_mode=render_mode)
+        
+        self.player_border_colors = {1: "#ffc0cb", 2: "#90ee90"}
+        self.player_path_colors = {1: "#d90429", 2: "#006400"}
+        self.water_color = "#00BFFF"
+        
+        self.photo_images_cache = {}
+        self.dice_images = {}
+        self.dice_image_size = (40, 40)
+
+        try:
+            if server_address:
+                from server import MatchClient  # 只有連線模式才載入 (asyncio 等)，不拖慢一般啟動
+                self.client = MatchClient(server_address)
+            self.main_frame = tk.Frame(self.master, bg="lightgrey", padx=5, pady=5)
+            self.main_frame.pack(expand=True, fill="both")
+            self.load_images()
+            self.create_widgets()
+            self.start_initial_setup()
+        except Exception as e:
+            messagebox.showerror("啟動錯誤", f"無法啟動遊戲: {e}")
+            self.master.destroy()
+
+    def load_images(self):
+        # 所有板塊與骰子圖都來自快取的圖片集，PhotoImage 在第一次顯示時才建立
+        self.atlas = SpriteAtlas(self.tile_pixel_size, self.dice_image_size[0])
+        self.dice_blank_image = ImageTk.PhotoImage(Image.new('RGBA', self.dice_image_size, (0,0,0,0)))
+
+    def get_dice_image(self, face):
+        if face not in self.dice_images: self.dice_images[face] = ImageTk.PhotoImage(self.atlas.dice(face))
+        return self.dice_images[face]
+
+    def get_rotated_pil_image(self, tile_type, rotation_state):
+        return self.atlas.tile(tile_type, rotation_state)
+
+    def get_rotated_image(self, tile_type, rotation_state):
+        cache_key = (tile_type, rotation_state)
+        if instrument.ENABLED: instrument.count("photo_cache_hits" if cache_key in self.photo_images_cache else "photo_cache_misses")
+        if cache_key not in self.photo_images_cache:
+            self.photo_images_cache[cache_key] = ImageTk.PhotoImage(self.atlas.tile(tile_type, rotation_state))
+        return self.photo_images_cache[cache_key]
+
+    def create_widgets(self):
+        status_frame = tk.Frame(self.main_frame, padx=10, pady=10)
+        status_frame.pack(fill="x")
+        self.status_label = tk.Label(status_frame, text="準備開始...", font=("Arial", 14), width=35, anchor="w")
+        self.status_label.pack(side="left", expand=True, fill="x")
+        self.current_tile_button = tk.Button(status_frame, relief="sunken", state="disabled", command=self.rotate_current_tile)
+        self.current_tile_button.pack(side="left", padx=10)
+        self.dice_text_label = tk.Label(status_frame, text="骰子:", font=("Arial", 14))
+        self.dice_text_label.pack(side="left")
+        self.dice_image_label = tk.Label(status_frame)
+        self.dice_image_label.pack(side="left", padx=(5,0))
+        self.hints_var = tk.BooleanVar(value=self.show_hints)
+        tk.Checkbutton(status_frame, text="提示", variable=self.hints_var, command=self.toggle_hints).pack(side="left", padx=(10,0))
+
+        board_width = self.game.board.cols * self.tile_pixel_size
+        board_height = self.game.board.rows * self.tile_pixel_size
+        # 大地圖超出視窗時改用捲軸檢視
+        view_width, view_height = min(board_width, 960), min(board_height, 720)
+        canvas_frame = tk.Frame(self.main_frame)
+        canvas_frame.pack(side="left" if self.debug_overlay else "top", pady=10)
+        self.board_canvas = CountingCanvas(canvas_frame, width=view_width, height=view_height, bg="white", scrollregion=(0, 0, board_width, board_height))
+        if board_width > view_width:
+            x_scroll = tk.Scrollbar(canvas_frame, orient="horizontal", command=self.board_canvas.xview)
+            x_scroll.pack(side="bottom", fill="x")
+            self.board_canvas.config(xscrollcommand=x_scroll.set)
+        if board_height > view_height:
+            y_scroll = tk.Scrollbar(canvas_frame, orient="vertical", command=self.board_canvas.yview)
+            y_scroll.pack(side="right", fill="y")
+            self.board_canvas.config(yscrollcommand=y_scroll.set)
+        self.board_canvas.pack(side="left")
+        self.board_canvas.bind("<Button-1>", self.on_canvas_click)
+        self.reset_board_view()
+        if self.debug_overlay:
+            # 除錯資訊放在棋盤右側自己的框架中，不遮住板塊也不攔截棋盤的點擊
+            debug_frame = tk.Frame(self.main_frame, bg="#ffffe0")
+            debug_frame.pack(side="left", fill="y", padx=(5, 0), pady=10)
+            self.debug_label = tk.Label(debug_frame, text="", font=("Courier", 9), justify="left", anchor="nw", bg="#ffffe0", width=44)
+            self.debug_label.pack(fill="both", expand=True)
+            instrument.listeners.append(self.update_debug_overlay)
+
+    def update_debug_overlay(self, record):
+        # 最近一筆紀錄：總耗時、最花時間的階段與計數器，再加上目前為止最慢的一筆
+        stages = sorted(record["stages"].items(), key=lambda item: -item[1])[:5]
+        lines = [f"{record['root']}  {record['total_ms']:.1f} ms"]
+        lines += [f"  {name:<30} {ms:8.1f}" for name, ms in stages]
+        lines += [f"  {name} = {value}" for name, value in sorted(record["counters"].items())]
+        slowest = instrument.slowest(1)[0]
+        lines.append(f"最慢: {slowest['root']} {slowest['total_ms']:.1f} ms")
+        self.debug_label.config(text="\n".join(lines))
+
+    def reset_board_view(self):
+        # 清空棋盤畫面；點陣模式重建合成圖與顯示用的 PhotoImage (活水遮罩也一併歸零)
+        self.board_canvas.delete("all")
+        if self.render_mode == "raster":
+            self.raster = BoardRaster(self.game.board.rows, self.game.board.cols, self.tile_pixel_size, self.get_rotated_pil_image, self.player_border_colors, self.water_color)
+            self.board_photo = ImageTk.PhotoImage(self.raster.base)  # 剛重建時沒有活水，base 就是顯示結果
+            self.board_canvas.create_image(0, 0, image=self.board_photo, anchor="nw", tags="board_raster")
+        else: self.draw_grid_lines()
+
+    def draw_grid_lines(self):
+        rows, cols = self.game.board.rows, self.game.board.cols
+        board_width = cols * self.tile_pixel_size
+        board_height = rows * self.tile_pixel_size
+        for i in range(1, cols): self.board_canvas.create_line(i * self.tile_pixel_size, 0, i * self.tile_pixel_size, board_height, fill="lightgrey")
+        for i in range(1, rows): self.board_canvas.create_line(0, i * self.tile_pixel_size, board_width, i * self.tile_pixel_size, fill="lightgrey")
+
+    def on_canvas_click(self, event):
+        col = int(self.board_canvas.canvasx(event.x)) // self.tile_pixel_size
+        row = int(self.board_canvas.canvasy(event.y)) // self.tile_pixel_size
+        if 0 <= col < self.game.board.cols and 0 <= row < self.game.board.rows:
+            self.on_board_click(row, col)
+
+    def update_border_color(self):
+        player_id = self.game.player_id
+        color = self.player_border_colors.get(player_id, "lightgrey")
+        self.main_frame.config(bg=color)
+
+    def start_initial_setup(self):
+        if self.client is not None:
+            self.status_label['text'] = "正在連線到伺服器..."
+            self.client.send("JOIN", self.game.board.rows, self.game.board.cols)
+            self.master.after(30, self.poll_server)
+            return
+        self.update_border_color()
+        self.update_status_label()
+        if self.is_ai_turn(): self.request_ai_move()
+
+    def is_my_turn(self):
+        return self.client is None or self.game.player_id == self.seat
+
+    def poll_server(self):
+        for message in self.client.poll():
+            if not self.handle_server_message(message[0], message[1:]): return
+        self.master.after(30, self.poll_server)
+
+    @instrument.timed()
+    def handle_server_message(self, kind, args):
+        # 回傳 False 表示連線已結束，不再輪詢
+        if kind == "WAIT": self.status_label['text'] = "等待對手加入..."
+        elif kind == "START":
+            self.seat = int(args[1])
+            self.players[self.seat - 1] += " (你)"
+            if self.ai is not None: self.ai_player = self.seat  # 電腦代替自己出手
+        elif kind == "TURN":
+            player, phase, tile_type = int(args[0]), args[1], int(args[2])
+            self.game.current_player_index = player - 1
+            if phase == "PLAYING":
+                self.game.current_drawn_tile, self.game.current_rotation = tile_type, 0
+                self.start_player_turn()
+            else:
+                self.update_border_color()
+                self.update_status_label()
+            if self.is_ai_turn(): self.request_ai_move()
+        elif kind == "MOVE":
+            r, c, tile_type, owner_id, rotation = map(int, args)
+            phase = self.game.game_phase
+            if phase == "PLAYING": self.game.current_drawn_tile = tile_type
+            move = self.game.play(r, c, rotation)
+            if move != (r, c, tile_type, owner_id or None, rotation):
+                # 本地狀態與伺服器不一致 (不合法或結果不同)，這一局無法再繼續
+                self.client.close()
+                self.current_tile_button.config(state="disabled")
+                messagebox.showerror("連線錯誤", f"本地對局狀態與伺服器不一致 (MOVE {' '.join(args)})，已中斷連線")
+                return False
+            self.show_move(phase, move)
+        elif kind == "SCORE": self.master.title(f"河流農場  {args[0]} : {args[1]}")
+        elif kind == "END":
+            self.client.close()
+            self.end_game()
+            return False
+        elif kind == "ERROR": self.status_label['text'] = " ".join(args)
+        else:
+            # LEFT / CLOSED
+            self.client.close()
+            messagebox.showinfo("連線中斷", "對手已離開" if kind == "LEFT" else "與伺服器的連線已中斷")
+            self.current_tile_button.config(state="disabled")
+            return False
+        return True
+
+    def is_ai_turn(self):
+        return self.ai is not None and self.game.game_phase in ("SETUP", "PLAYING") and self.game.player_id == self.ai_player
+
+    @instrument.timed()
+    def on_board_click(self, r, c):
+        if self.is_ai_turn() or not self.is_my_turn(): return
+        self.make_move(r, c)
+
+    @instrument.timed()
+    def make_move(self, r, c, rotation=None):
+        if self.client is not None:
+            # 送出後等伺服器回傳 MOVE 才更新畫面
+            if self.is_my_turn(): self.client.send("PLACE", r, c, self.game.current_rotation if rotation is None else rotation)
+            return
+        phase = self.game.game_phase
+        move = self.game.play(r, c, rotation)
+        if move is None: return
+        self.show_move(phase, move)
+        if self.game.game_phase == "ENDED": self.end_game()
+        elif self.game.game_phase == "SETUP":
+            self.update_border_color()
+            self.update_status_label()
+        else: self.start_player_turn()
+        if self.is_ai_turn(): self.request_ai_move()
+
+    def show_move(self, phase, move):
+        self.clear_move_hints()
+        self.place_tile_on_board(*move)
+        if phase == "PLAYING":
+            self.dice_image_label.config(image=self.dice_blank_image)
+            self.current_tile_button.config(state="disabled")
+
+    def request_ai_move(self):
+        # 電腦在背景執行緒搜尋，主迴圈定時檢查結果，畫面不會凍結
+        self.status_label['text'] = f"{self.players[self.game.current_player_index]} 思考中..."
+        self.current_tile_button.config(state="disabled")
+        self.ai_result = AI_PENDING
+        self.ai.start(self.game, lambda move: setattr(self, "ai_result", move))
+        self.master.after(50, self.poll_ai_move)
+
+    def poll_ai_move(self):
+        if self.ai_result is AI_PENDING:
+            self.master.after(50, self.poll_ai_move); return
+        r, c, rotation = self.ai_result
+        self.ai_result = AI_PENDING
+        self.make_move(r, c, rotation)
+            
+    @instrument.timed()
+    def place_tile_on_board(self, r, c, tile_type, owner_id, rotation):
+        # 棋盤狀態已由引擎更新，這裡只負責繪製
+        if self.raster is not None:
+            self.raster.draw_tile(r, c, tile_type, owner_id, rotation)
+            self.update_water_networks_display()
+            return
+        photo_image = self.get_rotated_image(tile_type, rotation)
+        x = c * self.tile_pixel_size + self.tile_pixel_size / 2
+        y = r * self.tile_pixel_size + self.tile_pixel_size / 2
+        self.board_canvas.create_image(x, y, image=photo_image, anchor="center")
+        if owner_id:
+             x1, y1 = c * self.tile_pixel_size, r * self.tile_pixel_size
+             self.board_canvas.create_rectangle(x1+2, y1+2, x1+self.tile_pixel_size-2, y1+self.tile_pixel_size-2, outline=self.player_border_colors[owner_id], width=3)
+        self.update_water_networks_display()
+
+    @instrument.timed()
+    def start_player_turn(self):
+        # 骰子已由引擎擲出，這裡更新畫面
+        self.update_border_color()
+        rolled_number = self.game.current_drawn_tile
+        self.dice_image_label.config(image=self.get_dice_image(rolled_number))
+        rotated_image = self.get_rotated_image(rolled_number, self.game.current_rotation)
+        self.current_tile_button.config(image=rotated_image, state="normal")
+        if not self.game.can_rotate() or not self.is_my_turn(): self.current_tile_button.config(state="disabled")
+        self.update_status_label()
+        if self.show_hints and self.is_my_turn() and not self.is_ai_turn(): self.show_move_hints()
+
+    def toggle_hints(self):
+        self.show_hints = self.hints_var.get()
+        if self.show_hints and self.game.game_phase == "PLAYING" and self.is_my_turn() and not self.is_ai_turn(): self.show_move_hints()
+        else: self.clear_move_hints()
+
+    @instrument.timed()
+    def show_move_hints(self):
+        # 一次評估所有空格與旋轉，標出 (自己 - 對手) 分差最大的位置；箭頭為建議的旋轉方向
+        self.clear_move_hints()
+        me = self.game.current_player_index
+        current = self.game.scores()
+        hints = evaluate_game(self.game)
+        best = best_moves(hints, me)
+        if len(best) == len(hints): return  # 每個位置都一樣，不標示
+        cells = {}
+        for r, c, rotation, scores, _ in best:
+            gain = (scores[me] - scores[1 - me]) - (current[me] - current[1 - me])
+            cells.setdefault((r, c), (gain, []))[1].append(rotation)
+        size = self.tile_pixel_size
+        for (r, c), (gain, rotations) in cells.items():
+            x1, y1 = c * size, r * size
+            self.board_canvas.create_rectangle(x1+4, y1+4, x1+size-4, y1+size-4, fill="#ffd700", stipple="gray25", outline="#ffa500", width=2, tags="move_hint")
+            label = f"{gain:+d}" + ("" if not self.game.can_rotate() else " " + "".join("↑→↓←"[rotation] for rotation in rotations))
+            self.board_canvas.create_text(x1 + size / 2, y1 + size / 2, text=label, font=("Arial", max(8, size // 6), "bold"), fill="#8b4513", tags="move_hint")
+
+    def clear_move_hints(self):
+        self.board_canvas.delete("move_hint")
+    
+    @instrument.timed()
+    def rotate_current_tile(self):
+        if not self.game.rotate(): return
+        rotated_image = self.get_rotated_image(self.game.current_drawn_tile, self.game.current_rotation)
+        self.current_tile_button.config(image=rotated_image)
+
+    def update_status_label(self):
+        player = self.players[self.game.current_player_index]
+        if self.game.game_phase == "SETUP": self.status_label['text'] = f"輪到 {player}：請在地圖上放置你的田地(4)。"
+        elif self.game.game_phase == "PLAYING": self.status_label['text'] = f"輪到 {player}：請放置板塊 {self.game.current_drawn_tile}。"
+
+    @instrument.timed()
+    def update_water_networks_display(self):
+        # 活水覆蓋只在點陣模式繪製；畫布模式逐格建立矩形太慢，原本就停用了
+        if self.raster is None: return
+        self.raster.update_water(self.game.board.water)
+        self.flush_raster()
+
+    @instrument.timed()
+    def flush_raster(self):
+        # 只把變動的板塊區域複製進顯示中的 PhotoImage，避免整張重新轉換
+        regions = self.raster.flush()
+        if instrument.ENABLED: instrument.count("raster_patches", len(regions))
+        for x, y, region in regions:
+            patch = ImageTk.PhotoImage(region)
+            self.board_canvas.tk.call(str(self.board_photo), "copy", str(patch), "-to", x, y)
+
+    @instrument.timed()
+    def end_game(self):
+        self.status_label['text'] = "遊戲結束！正在計算分數..."
+        self.main_frame.config(bg="lightgrey")
+        self.master.update_idletasks()
+        report = self.build_and_analyze_grid()
+        scores = report.scores
+        if self.recorder:
+            try:
+                with CorpusWriter(self.record_path) as writer: writer.add(self.recorder, scores)
+            except (OSError, ValueError, struct.error) as e: messagebox.showwarning("棋譜", f"無法寫入對局庫: {e}")
+        self.display_results_window(report)
+        self.current_tile_button.config(state="disabled")
+        result_text = f"遊戲結束！\n\n最終得分：\n玩家1: {scores[0]} 分\n玩家2: {scores[1]} 分\n\n"
+        if scores[0] > scores[1]: result_text += "玩家1 獲勝！"
+        elif scores[1] > scores[0]: result_text += "玩家2 獲勝！"
+        else: result_text += "平手！"
+        # 結果對話框會等待使用者關閉，留到這次事件處理結束後再顯示，不算進回合耗時
+        self.master.after_idle(self.show_final_result, result_text, scores)
+
+    def show_final_result(self, result_text, scores):
+        if self.trace_path:
+            try: instrument.export(self.trace_path, scores=scores)
+            except OSError as e: messagebox.showwarning("效能追蹤", f"無法寫入追蹤檔: {e}")
+        messagebox.showinfo("遊戲結束", result_text)
+
+    def draw_results_background(self, canvas, master_grid, fields_by_player, source_tiles, cell_size):
+        rows, cols = len(master_grid), len(master_grid[0])
+        for r in range(rows):
+            for c in range(cols):
+                if master_grid[r][c] == 1:
+                    x1, y1, x2, y2 = c*cell_size, r*cell_size, (c+1)*cell_size, (r+1)*cell_size
+                    canvas.create_rectangle(x1, y1, x2, y2, fill="lightgrey", outline="")
+        for pid, fields in fields_by_player.items():
+            for r_field, c_field in fields:
+                x1, y1, x2, y2 = c_field*7*cell_size, r_field*7*cell_size, (c_field+1)*7*cell_size, (r_field+1)*7*cell_size
+                canvas.create_rectangle(x1, y1, x2, y2, outline=self.player_border_colors[pid], width=3)
+        for r_source, c_source in source_tiles:
+            center_x, center_y = (c_source*7 + 3.5)*cell_size, (r_source*7 + 3.5)*cell_size
+            radius = 2.5 * cell_size
+            canvas.create_oval(center_x-radius, center_y-radius, center_x+radius, center_y+radius, fill="#4682b4", outline="")
+
+    @instrument.timed()
+    def display_results_window(self, report):
+        # 清單只列出 田地 -> 水源；路徑在選取時才由 report.field_paths 逐田地重建
+        master_grid, fields_by_player, source_tiles = report.grid, report.fields_by_player, report.source_tiles
+        result_window = tk.Toplevel(self.master)
+        result_window.title("最終結果路線圖")
+        notebook = ttk.Notebook(result_window)
+        notebook.pack(pady=10, padx=10, expand=True, fill="both")
+        rows, cols = len(master_grid), len(master_grid[0])
+        cell_size = max(1, min(10, 840 // cols))
+        # 點陣模式下兩個分頁共用同一張合成底圖
+        background = ImageTk.PhotoImage(render_results_image(master_grid, fields_by_player, source_tiles, cell_size, self.player_border_colors)) if self.render_mode == "raster" else None
+        for player_id in [1, 2]:
+            player_frame = ttk.Frame(notebook, padding="10")
+            notebook.add(player_frame, text=f"玩家 {player_id} 的得分路徑")
+            list_frame = tk.Frame(player_frame); list_frame.pack(side="left", fill="y", padx=(0, 10))
+            tk.Label(list_frame, text="選擇要檢視的路徑:").pack()
+            path_listbox = tk.Listbox(list_frame, selectmode="browse", height=20, width=35); path_listbox.pack(fill="y")
+            canvas_frame = tk.Frame(player_frame); canvas_frame.pack(side="right", expand=True, fill="both")
+            canvas = CountingCanvas(canvas_frame, width=cols*cell_size, height=rows*cell_size, bg="white"); canvas.pack()
+            if background is not None:
+                canvas.create_image(0, 0, image=background, anchor="nw")
+                canvas.background = background  # 保留參考，避免影像被回收
+            else: self.draw_results_background(canvas, master_grid.tolist(), fields_by_player, source_tiles, cell_size)
+            player_routes = [(field, source) for field in fields_by_player[player_id] for source in report.field_sources[field]]
+            if player_routes: path_listbox.insert(tk.END, *(f"路線 {i+1}: 田地{field} -> 水源{source}" for i, (field, source) in enumerate(player_routes)))
+            def on_path_select(event, pl_id=player_id, pl_routes=player_routes, cv=canvas, field_paths={}):
+                cv.delete("current_path")
+                selection_indices = event.widget.curselection()
+                if not selection_indices: return
+                field, source = pl_routes[selection_indices[0]]
+                if field not in field_paths: field_paths[field] = {path_data['source']: path_data['path'] for path_data in report.field_paths(field)}
+                path, path_color = field_paths[field].get(source), self.player_path_colors[pl_id]
+                r_field, c_field = field
+                field_center_x, field_center_y = (c_field*7 + 3.5)*cell_size, (r_field*7 + 3.5)*cell_size
+                if path:
+                    pixel_path = [(c*cell_size + cell_size/2, r*cell_size + cell_size/2) for r, c in path]
+                    start_of_path_x, start_of_path_y = pixel_path[0]
+                    cv.create_line(field_center_x, field_center_y, start_of_path_x, start_of_path_y, fill=path_color, width=3, tags="current_path")
+                    if len(path) > 1: cv.create_line(pixel_path, fill=path_color, width=3, tags="current_path")
+            path_listbox.bind("<<ListboxSelect>>", on_path_select)
+            
+    @instrument.timed()
+    def build_and_analyze_grid(self):
+        return self.game.board.score()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="河流農場")
+    parser.add_argument("--ai", type=int, choices=[1, 2], help="由電腦操作的玩家")
+    parser.add_argument("--ai-time", type=float, default=1.0, help="電腦每步的思考時間 (秒)")
+    parser.add_argument("--rows", type=int, default=BOARD_ROWS, help="棋盤列數 (板塊)")
+    parser.add_argument("--cols", type=int, default=BOARD_COLS, help="棋盤行數 (板塊)")
+    parser.add_argument("--sparse", action="store_true", help="只保存已放置的板塊 (大地圖用)")
+    parser.add_argument("--tile-size", type=int, default=80, help="板塊顯示大小 (像素)")
+    parser.add_argument("--render", choices=["raster", "canvas"], default="raster", help="棋盤繪製方式")
+    parser.add_argument("--record", help="將棋譜附加到對局庫檔案")
+    parser.add_argument("--hints", action="store_true", help="擲骰後標出最佳落點")
+    parser.add_argument("--connect", metavar="ADDRESS", help="連到對戰伺服器 (host:port 或 Unix socket 路徑)")
+    parser.add_argument("--debug-overlay", action="store_true", help="在棋盤上顯示每次操作的階段耗時與計數")
+    parser.add_argument("--trace", help="終局時把這一局的效能追蹤附加到檔案 (JSON lines)")
+    args = parser.parse_args()
+    if not valid_board_size(args.rows, args.cols): parser.error(f"棋盤至少 1x1 且共 {MIN_BOARD_TILES} 格以上")
+    root = tk.Tk()
+    app = RiverGameGUI(root, ai_player=args.ai, ai_time_budget=args.ai_time, rows=args.rows, cols=args.cols, sparse=args.sparse, tile_pixel_size=args.tile_size, render_mode=args.render, record_path=args.record, show_hints=args.hints, server_address=args.connect, debug_overlay=args.debug_overlay, trace_path=args.trace)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,250 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from engine import Board, SparseBoard
+
+# ==============================================================================
+# 對局紀錄：每步 (格子, 板塊 1~6, 旋轉 0~3, 擁有者) 壓成 2 位元組
+#   位元 0-1 擁有者 (0 = 無)、2-3 旋轉、4-6 板塊-1、7-15 格子編號 r*cols+c
+# 設置階段的田地與每回合擲出的骰子 (即放置的板塊) 都包含在內
+# 棋盤超過 512 格時改用 4 位元組 (寬格式)，格子編號放在位元 7 以上
+#
+# 對局庫檔案：
+#   檔頭 32 位元組 | 各局的步驟資料依序排列 | 索引 (每局固定 28 位元組)
+#   索引項目：資料位置、步數、列數、行數、旗標、雙方最終分數 (32 位元，大地圖的分數會超過 65535)
+# 寫入時先附加資料與新索引，最後才改寫檔頭，中途中斷時檔頭仍指向原本完整的索引
+# ==============================================================================
+MAGIC = b"TWCORPUS"
+VERSION = 1
+HEADER = struct.Struct("<8sHHIQQ")        # 魔術字、版本、保留、保留、對局數、索引位置
+INDEX_ENTRY = struct.Struct("<QIHHB3xII")  # 資料位置、步數、列數、行數、旗標、分數1、分數2
+FLAG_WIDE = 1
+NARROW_CELLS = 1 << 9
+
+def encode_move(r, c, tile_type, owner_id, rotation, cols):
+    return ((r * cols + c) << 7) | ((tile_type - 1) << 4) | (rotation << 2) | (owner_id or 0)
+
+def decode_move(code, cols):
+    r, c = divmod(code >> 7, cols)
+    return r, c, ((code >> 4) & 7) + 1, (code & 3) or None, (code >> 2) & 3
+
+def move_typecode(flags): return "I" if flags & FLAG_WIDE else "H"
+
+def data_size(n_moves, flags): return n_moves * array(move_typecode(flags)).itemsize
+
+LOCK_OFFSET = 1 << 40  # Windows 的鎖會擋住讀取，改鎖檔尾之外的位元組
+
+def _lock(file):
+    if fcntl: fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+    else: file.seek(LOCK_OFFSET); msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+
+def _open_locked(path):
+    # 取得獨占鎖後，確認等待期間檔案沒有被另一個寫入者整理 (os.replace) 成新檔
+    while True:
+        file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644), "r+b")
+        _lock(file)
+        try:
+            if os.path.samestat(os.fstat(file.fileno()), os.stat(path)): return file
+        except FileNotFoundError: pass
+        file.close()
+
+class GameRecorder:
+    # 掛在 GameState 上，每放一塊就記下一個編碼；整局留在記憶體中 (每步 2 或 4 位元組)，
+    # 終局後才由 CorpusWriter 寫入對局庫，未下完或程式中斷的對局不會留下紀錄
+    def __init__(self, game):
+        self.rows, self.cols = game.board.rows, game.board.cols
+        self.flags = FLAG_WIDE if self.rows * self.cols > NARROW_CELLS else 0
+        self.moves = array(move_typecode(self.flags))
+        self.scores = None  # 終局時填入
+        game.listeners.append(self.on_move)
+
+    def on_move(self, game, move):
+        self.moves.append(encode_move(*move, self.cols))
+        if game.game_phase == "ENDED": self.scores = game.scores()
+
+    def to_bytes(self):
+        data = self.moves
+        if sys.byteorder != "little":
+            data = array(data.typecode, data); data.byteswap()
+        return data.tobytes()
+
+class CorpusWriter:
+    # 寫入期間持有檔案的獨占鎖，同一個對局庫的其他寫入者會等待
+    # 新的步驟資料接在檔尾 (舊索引之後)，舊的檔頭與索引不動；close() 時寫出合併後的索引，
+    # fsync 後才改寫檔頭。舊索引留下的空間超過有效內容時，整理成新檔後以 os.replace 取代
+    def __init__(self, path):
+        self.path = path
+        self.file = _open_locked(path)
+        self.index = bytearray()
+        self.added = 0
+        self.data_bytes = 0  # 索引中各局步驟資料的總量
+        size = os.fstat(self.file.fileno()).st_size
+        if size == 0:
+            self.file.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0, HEADER.size))
+            self._sync()
+        else:
+            self.file.seek(0)
+            # 不足一個檔頭的非空檔案也不是對局庫，不能當成新檔清空
+            header = self.file.read(HEADER.size)
+            magic, version, _, _, n_games, index_offset = HEADER.unpack(header) if len(header) == HEADER.size else (None, None, 0, 0, 0, 0)
+            if magic != MAGIC or version != VERSION or index_offset + n_games * INDEX_ENTRY.size > size:
+                self.file.close(); raise ValueError(f"不是對局庫檔案: {path}")
+            self.file.seek(index_offset)
+            self.index = bytearray(self.file.read(n_games * INDEX_ENTRY.size))
+            self.data_bytes = sum(data_size(entry[1], entry[4]) for entry in INDEX_ENTRY.iter_unpack(self.index))
+        self.file.seek(0, os.SEEK_END)
+
+    def __enter__(self): return self
+
+    def __exit__(self, *exc): self.close()
+
+    def __len__(self): return len(self.index) // INDEX_ENTRY.size
+
+    def add(self, recorder, scores=None):
+        scores = scores or recorder.scores or [0, 0]
+        offset = self.file.tell()
+        data = recorder.to_bytes()
+        # 先打包索引項目：數值超出範圍 (struct.error) 時什麼都還沒寫入
+        entry = INDEX_ENTRY.pack(offset, len(recorder.moves), recorder.rows, recorder.cols, recorder.flags, *scores)
+        self.file.write(data)
+        self.index += entry
+        self.data_bytes += len(data)
+        self.added += 1
+        return len(self) - 1
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file.closed: return
+        try:
+            if not self.added: return
+            index_offset = self.file.tell()
+            self.file.write(self.index)
+            self._sync()
+            self.file.seek(0)
+            self.file.write(HEADER.pack(MAGIC, VERSION, 0, 0, len(self), index_offset))
+            self._sync()
+            dead = index_offset - HEADER.size - self.data_bytes
+            if dead > self.data_bytes + len(self.index): self._compact()
+        finally: self.file.close()
+
+    def _compact(self):
+        # 依索引順序把各局資料複製到新檔再取代舊檔；失敗 (例如 Windows 上檔案正被讀取) 時留待下次
+        temp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp, "wb") as out:
+                out.write(bytes(HEADER.size))
+                index = bytearray()
+                for offset, n_moves, rows, cols, flags, *scores in INDEX_ENTRY.iter_unpack(self.index):
+                    self.file.seek(offset)
+                    index += INDEX_ENTRY.pack(out.tell(), n_moves, rows, cols, flags, *scores)
+                    out.write(self.file.read(data_size(n_moves, flags)))
+                index_offset = out.tell()
+                out.write(index)
+                out.seek(0)
+                out.write(HEADER.pack(MAGIC, VERSION, 0, 0, len(self), index_offset))
+                out.flush(); os.fsync(out.fileno())
+            os.replace(temp, self.path)
+        except OSError:
+            if os.path.exists(temp): os.remove(temp)
+
+class GameRecord:
+    # 對局庫中的一局；只從 mmap 取出這一局的步驟資料，不讀入整個檔案
+    def __init__(self, data, rows, cols, flags, scores):
+        self.rows, self.cols, self.flags, self.scores = rows, cols, flags, scores
+        self.codes = array(move_typecode(flags))
+        self.codes.frombytes(data)
+        if sys.byteorder != "little": self.codes.byteswap()
+
+    def __len__(self): return len(self.codes)
+
+    def moves(self):
+        cols = self.cols
+        for code in self.codes: yield decode_move(code, cols)
+
+    def new_board(self, sparse=None):
+        if sparse is None: sparse = self.rows * self.cols > NARROW_CELLS
+        return (SparseBoard if sparse else Board)(self.rows, self.cols)
+
+    def position(self, n_moves=None, sparse=None):
+        # 重建前 n_moves 步後的盤面 (預設為終局)
+        board = self.new_board(sparse)
+        for i, (r, c, tile_type, owner_id, rotation) in enumerate(self.moves()):
+            if n_moves is not None and i >= n_moves: break
+            board.place(r, c, tile_type, owner_id, rotation)
+        return board
+
+    def positions(self, sparse=None):
+        # 逐步產生 (步驟, 盤面)；盤面是同一個物件，需要保留時請自行 copy()
+        board = self.new_board(sparse)
+        for move in self.moves():
+            board.place(*move)
+            yield move, board
+
+    def rescore(self, mode=None):
+        board = self.position()
+        return board.scores() if mode is None else board.score(mode).scores
+
+class Corpus:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, _, self.n_games, self.index_offset = HEADER.unpack_from(self.map, 0) if len(self.map) >= HEADER.size else (None, None, 0, 0, 0, 0)
+        if magic != MAGIC or version != VERSION: self.close(); raise ValueError(f"不是對局庫檔案: {path}")
+
+    def __enter__(self): return self
+
+    def __exit__(self, *exc): self.close()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __len__(self): return self.n_games
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.n_games: raise IndexError(i)
+        offset, n_moves, rows, cols, flags, score1, score2 = INDEX_ENTRY.unpack_from(self.map, self.index_offset + i * INDEX_ENTRY.size)
+        return GameRecord(self.map[offset:offset + data_size(n_moves, flags)], rows, cols, flags, (score1, score2))
+
+    def __iter__(self):
+        for i in range(self.n_games): yield self[i]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="河流農場 對局庫")
+    parser.add_argument("corpus", help="對局庫檔案")
+    parser.add_argument("--verify", action="store_true", help="重播每一局並比對最終分數")
+    parser.add_argument("--show", type=int, help="列出第 N 局的每一步")
+    args = parser.parse_args(argv)
+
+    with Corpus(args.corpus) as corpus:
+        if args.show is not None:
+            record = corpus[args.show]
+            print(f"{record.rows}x{record.cols}，{len(record)} 步，分數 {record.scores}")
+            for r, c, tile_type, owner_id, rotation in record.moves():
+                print(f"({r}, {c}) 板塊{tile_type} 旋轉{rotation}" + (f" 玩家{owner_id}" if owner_id else ""))
+            return 0
+        totals, mismatches = [0, 0], 0
+        for i, record in enumerate(corpus):
+            totals[0] += record.scores[0]; totals[1] += record.scores[1]
+            if args.verify and list(record.rescore()) != list(record.scores):
+                mismatches += 1
+                print(f"第 {i} 局分數不符: 紀錄 {record.scores}，重算 {record.rescore()}")
+        games = max(len(corpus), 1)
+        print(f"{len(corpus)} 局，平均分數 玩家1 {totals[0] / games:.2f}、玩家2 {totals[1] / games:.2f}")
+        return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw
+
+from engine import TILE_SIZE
+
+# ==============================================================================
+# 點陣合成繪圖：整個棋盤 (板塊、田地外框、活水覆蓋) 合成在一張 PIL 圖上
+# 每步只重畫有變動的板塊區域，畫布上只需一個影像項目
+# ==============================================================================
+
+# 合成圖的像素上限：base 為 RGB (3 位元組/像素)，Tk 的 PhotoImage 另存一份 RGBA (4 位元組/像素)
+# 4096x4096 約 48 MB + 64 MB；200x200 的地圖以 80 像素繪製會超過 1.5 GB
+MAX_BOARD_PIXELS = 4096 * 4096
+
+def fit_tile_pixel_size(rows, cols, tile_pixel_size):
+    # 大地圖縮小板塊像素 (取 TILE_SIZE 的倍數，每格至少 1 像素)，讓整張圖不超過 MAX_BOARD_PIXELS
+    limit = int((MAX_BOARD_PIXELS / (rows * cols)) ** 0.5)
+    return tile_pixel_size if tile_pixel_size <= limit else max(TILE_SIZE, limit - limit % TILE_SIZE)
+
+class BoardRaster:
+    def __init__(self, rows, cols, tile_pixel_size, tile_image, border_colors, water_color, grid_color="lightgrey"):
+        self.rows, self.cols = rows, cols
+        self.tile_pixel_size = tile_pixel_size
+        self.tile_image = tile_image  # (tile_type, rotation) -> PIL 圖
+        self.border_colors = border_colors
+        self.water_rgba = ImageColor.getrgb(water_color)[:3] + (128,)  # 半透明，相當於原本的 gray50 點畫
+        size = (cols * tile_pixel_size, rows * tile_pixel_size)
+        # base 只有板塊層；加上活水覆蓋後的結果只存在顯示端的 PhotoImage，不另存一份
+        self.base = Image.new("RGB", size, "white")
+        draw = ImageDraw.Draw(self.base)
+        for i in range(1, cols): draw.line([(i * tile_pixel_size, 0), (i * tile_pixel_size, size[1])], fill=grid_color)
+        for i in range(1, rows): draw.line([(0, i * tile_pixel_size), (size[0], i * tile_pixel_size)], fill=grid_color)
+        self.live_mask = np.zeros((rows * TILE_SIZE, cols * TILE_SIZE), dtype=bool)
+        self.water_seen = 0  # 已讀到水網追蹤器 live_log 的哪個位置
+        self.dirty = set()
+
+    def tile_box(self, r, c):
+        size = self.tile_pixel_size
+        return c * size, r * size, (c + 1) * size, (r + 1) * size
+
+    def draw_tile(self, r, c, tile_type, owner_id, rotation):
+        x1, y1, x2, y2 = self.tile_box(r, c)
+        tile = self.tile_image(tile_type, rotation)
+        if tile.mode == "RGBA": self.base.paste(tile, (x1, y1), tile)
+        else: self.base.paste(tile, (x1, y1))
+        if owner_id:
+            ImageDraw.Draw(self.base).rectangle([x1 + 2, y1 + 2, x2 - 3, y2 - 3], outline=self.border_colors[owner_id], width=3)
+        self.dirty.add((r, c))
+
+    def update_water(self, water):
+        # 活水只增不減：只取上次更新後新變成活水的格子，重畫它們所在的板塊
+        cells, self.water_seen = water.live_cells(self.water_seen)
+        if not cells: return
+        rows, cols = zip(*cells)
+        self.live_mask[list(rows), list(cols)] = True
+        self.dirty.update({(r // TILE_SIZE, c // TILE_SIZE) for r, c in cells})
+
+    def flush(self):
+        # 重新合成所有髒區域，回傳 [(x, y, 區域圖)] 供顯示端局部更新
+        regions = []
+        size = self.tile_pixel_size
+        for r, c in sorted(self.dirty):
+            box = self.tile_box(r, c)
+            region = self.base.crop(box)
+            tile_mask = self.live_mask[r*TILE_SIZE:(r+1)*TILE_SIZE, c*TILE_SIZE:(c+1)*TILE_SIZE]
+            if tile_mask.any():
+                alpha = Image.fromarray(tile_mask.astype(np.uint8) * self.water_rgba[3]).resize((size, size), Image.NEAREST)
+                region.paste(self.water_rgba[:3], (0, 0, size, size), alpha)
+            regions.append((box[0], box[1], region))
+        self.dirty.clear()
+        return regions
+
+def render_results_image(master_grid, fields_by_player, source_tiles, cell_size, border_colors, source_color="#4682b4"):
+    # 結果畫面的靜態底圖：水道、田地外框、水源，兩個分頁共用同一張圖
+    grid = np.asarray(master_grid, dtype=np.uint8)
+    rows, cols = grid.shape
+    pixels = np.where(grid[:, :, None] == 1, np.array(ImageColor.getrgb("lightgrey"), dtype=np.uint8), np.uint8(255))
+    image = Image.fromarray(pixels.astype(np.uint8), "RGB").resize((cols * cell_size, rows * cell_size), Image.NEAREST)
+    draw = ImageDraw.Draw(image)
+    tile_pixels = TILE_SIZE * cell_size
+    for pid, fields in fields_by_player.items():
+        for r_field, c_field in fields:
+            x1, y1 = c_field * tile_pixels, r_field * tile_pixels
+            draw.rectangle([x1, y1, x1 + tile_pixels - 1, y1 + tile_pixels - 1], outline=border_colors[pid], width=3)
+    radius = 2.5 * cell_size
+    for r_source, c_source in source_tiles:
+        center_x, center_y = (c_source * TILE_SIZE + 3.5) * cell_size, (r_source * TILE_SIZE + 3.5) * cell_size
+        draw.ellipse([center_x - radius, center_y - radius, center_x + radius, center_y + radius], fill=source_color)
+    return image
@@ -0,0 +1,324 @@
+import argparse
+import asyncio
+import gc
+import multiprocessing
+import os
+import queue
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+from engine import GameState, BOARD_ROWS, BOARD_COLS, valid_board_size
+
+# ==============================================================================
+# 多局對戰伺服器：每局只是一個稀疏棋盤的 GameState，擲骰與合法性檢查都在伺服器端
+# 協定為一行一個指令，欄位以空白分隔 (TCP 或 Unix socket)
+#
+#   用戶端 -> 伺服器
+#     JOIN [rows cols]        排隊等待同尺寸的對手
+#     PLACE r c [rotation]    放置目前的板塊 (省略旋轉時為 0)
+#     QUIT
+#   伺服器 -> 用戶端
+#     WAIT                    已排隊
+#     START id seat rows cols 對局開始，seat 為自己的玩家編號 (1 或 2)
+#     TURN player phase tile  輪到 player；SETUP 階段 tile 為田地 (4)，PLAYING 階段為擲出的板塊
+#     MOVE r c tile owner rotation   剛放置的板塊 (owner 0 表示無)，兩位玩家都會收到
+#     SCORE s1 s2             每步之後的分數
+#     END s1 s2               終局
+#     LEFT                    對手離線，對局結束
+#     ERROR 訊息
+# ==============================================================================
+MAX_LINE = 256
+MAX_BOARD_SIDE = 64
+WRITE_BUFFER_LIMIT = 64 * 1024  # 讀取太慢的用戶端累積超過此量就中斷
+
+def parse_ints(fields, count):
+    if len(fields) != count: raise ValueError
+    return [int(x) for x in fields]
+
+def encode_lines(lines):
+    # 同一次更新的多行合併成一次寫入
+    return "".join(line + "\n" for line in lines).encode()
+
+class Connection(asyncio.Protocol):
+    # 每條連線只有這個物件與其 transport，不為每位玩家建立 Task / Stream，物件數與排程成本都低
+    __slots__ = ("server", "transport", "buffer", "match", "seat", "size")
+
+    def __init__(self, server):
+        self.server, self.transport, self.buffer = server, None, b""
+        self.match, self.seat, self.size = None, None, None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.connections += 1
+
+    def data_received(self, data):
+        buffer = self.buffer + data
+        while not self.transport.is_closing():
+            line, newline, buffer = buffer.partition(b"\n")
+            if not newline: buffer = line; break
+            self.server.handle_line(self, line)
+        if len(buffer) > MAX_LINE: self.send("ERROR 指令過長"); self.transport.close()
+        self.buffer = buffer
+
+    def connection_lost(self, exc):
+        self.server.leave(self)
+        self.server.connections -= 1
+
+    def write(self, data):
+        if self.transport.is_closing(): return
+        self.transport.write(data)
+        if self.transport.get_write_buffer_size() > WRITE_BUFFER_LIMIT: self.transport.close()
+
+    def send(self, *lines): self.write(encode_lines(lines))
+
+class Match:
+    __slots__ = ("id", "game", "players")
+
+    def __init__(self, match_id, game, players):
+        self.id, self.game, self.players = match_id, game, players
+
+    def broadcast(self, *lines):
+        data = encode_lines(lines)
+        for player in self.players: player.write(data)
+
+    def turn_line(self):
+        game = self.game
+        if game.game_phase == "ENDED": return "END {} {}".format(*game.scores())
+        return f"TURN {game.player_id} {game.game_phase} {game.pending_tile()[0]}"
+
+class MatchServer:
+    def __init__(self, rng=None):
+        # 所有對局共用一個亂數產生器擲骰，不必每局保存一份狀態
+        self.rng = rng if rng is not None else random.SystemRandom()
+        self.waiting = {}  # (rows, cols) -> 排隊中的連線
+        self.matches = {}
+        self.next_id = 1
+        self.moves_played = 0
+        self.connections = 0
+
+    def handle_line(self, conn, line):
+        fields = line.decode("utf-8", "replace").split()
+        if not fields: return
+        command = fields[0].upper()
+        if command == "QUIT": conn.transport.close()
+        else: self.dispatch(conn, command, fields[1:])
+
+    def dispatch(self, conn, command, args):
+        if command == "JOIN": self.join(conn, args)
+        elif command == "PLACE": self.place(conn, args)
+        else: conn.send(f"ERROR 未知的指令 {command}")
+
+    def join(self, conn, args):
+        if conn.match is not None or conn.size is not None: conn.send("ERROR 已在對局中"); return
+        try: rows, cols = parse_ints(args, 2) if args else (BOARD_ROWS, BOARD_COLS)
+        except ValueError: conn.send("ERROR 用法: JOIN [rows cols]"); return
+        if not (valid_board_size(rows, cols) and rows <= MAX_BOARD_SIDE and cols <= MAX_BOARD_SIDE):
+            conn.send("ERROR 棋盤尺寸不合法"); return
+        opponent = self.waiting.pop((rows, cols), None)
+        if opponent is None:
+            conn.size = (rows, cols)
+            self.waiting[conn.size] = conn
+            conn.send("WAIT")
+            return
+        match = Match(self.next_id, GameState(rng=self.rng, rows=rows, cols=cols, sparse=True), (opponent, conn))
+        self.next_id += 1
+        self.matches[match.id] = match
+        for seat, player in enumerate(match.players, 1):
+            player.match, player.seat, player.size = match, seat, None
+            player.send(f"START {match.id} {seat} {rows} {cols}", match.turn_line())
+
+    def place(self, conn, args):
+        match = conn.match
+        if match is None: conn.send("ERROR 尚未開始對局"); return
+        game = match.game
+        if game.player_id != conn.seat: conn.send("ERROR 還沒輪到你"); return
+        try:
+            r, c, rotation = parse_ints(args, 3) if len(args) == 3 else parse_ints(args, 2) + [0]
+        except ValueError: conn.send("ERROR 用法: PLACE r c [rotation]"); return
+        if not (0 <= r < game.board.rows and 0 <= c < game.board.cols and 0 <= rotation < 4):
+            conn.send("ERROR 位置或旋轉不合法"); return
+        move = game.play(r, c, rotation)
+        if move is None: conn.send("ERROR 該位置已有板塊"); return
+        self.moves_played += 1
+        r, c, tile_type, owner_id, rotation = move
+        match.broadcast(f"MOVE {r} {c} {tile_type} {owner_id or 0} {rotation}", "SCORE {} {}".format(*game.scores()), match.turn_line())
+        if game.game_phase == "ENDED": self.finish(match)
+
+    def finish(self, match):
+        self.matches.pop(match.id, None)
+        for player in match.players: player.match = player.seat = None
+
+    def leave(self, conn):
+        if conn.size is not None and self.waiting.get(conn.size) is conn: del self.waiting[conn.size]
+        match = conn.match
+        if match is None: return
+        self.finish(match)
+        for player in match.players:
+            if player is not conn: player.send("LEFT")
+
+async def serve(server, host="127.0.0.1", port=8765, unix_path=None):
+    loop = asyncio.get_running_loop()
+    if unix_path: return await loop.create_unix_server(lambda: Connection(server), unix_path)
+    return await loop.create_server(lambda: Connection(server), host, port)
+
+# ==============================================================================
+# 用戶端：背景執行緒讀取伺服器訊息放進佇列，GUI 以 after() 定時取出處理
+# ==============================================================================
+def parse_address(address):
+    # "host:port" 為 TCP，其餘視為 Unix socket 路徑
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit(): return socket.create_connection((host, int(port)))
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(address)
+    return sock
+
+class MatchClient:
+    def __init__(self, address):
+        self.sock = parse_address(address)
+        self.messages = queue.Queue()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        try:
+            for line in self.sock.makefile("r", encoding="utf-8", errors="replace"):
+                self.messages.put(line.split())
+        except OSError: pass
+        self.messages.put(["CLOSED"])
+
+    def send(self, *fields):
+        try: self.sock.sendall((" ".join(str(x) for x in fields) + "\n").encode())
+        except OSError: self.messages.put(["CLOSED"])
+
+    def poll(self):
+        # 取出目前所有已收到的訊息，不會阻塞
+        messages = []
+        while True:
+            try: messages.append(self.messages.get_nowait())
+            except queue.Empty: return messages
+
+    def close(self):
+        try: self.sock.close()
+        except OSError: pass
+
+# ==============================================================================
+# 壓力測試：本機用戶端同時進行大量對局 (隨機落子)，量測「送出 PLACE 到收到 MOVE」的往返延遲
+# 用戶端分散在多個工作行程 (各自的事件迴圈)，伺服器單獨在主行程中執行，延遲不含用戶端本身的排程
+# 用戶端每步有思考時間，與真人對局的負載相近
+# ==============================================================================
+async def bot_player(reader, writer, rng, latencies, think):
+    writer.write(b"JOIN\n")
+    seat, rows, cols, occupied, sent_at = None, 0, 0, set(), None
+    while True:
+        line = await reader.readline()
+        if not line: return
+        fields = line.split()
+        kind = fields[0]
+        if kind == b"START":
+            seat, rows, cols = int(fields[2]), int(fields[3]), int(fields[4])
+        elif kind == b"MOVE":
+            occupied.add((int(fields[1]), int(fields[2])))
+            if sent_at is not None: latencies.append(time.perf_counter() - sent_at); sent_at = None
+        elif kind == b"TURN" and int(fields[1]) == seat:
+            if think: await asyncio.sleep(rng.uniform(0, 2 * think))
+            r, c = rng.choice([(r, c) for r in range(rows) for c in range(cols) if (r, c) not in occupied])
+            sent_at = time.perf_counter()
+            writer.write(f"PLACE {r} {c} {rng.randrange(4)}\n".encode())
+        elif kind in (b"END", b"LEFT", b"ERROR"):
+            writer.write(b"QUIT\n")
+            await writer.drain()
+            writer.close()
+            return
+
+def run_bots(address, n_bots, seed, think):
+    # 工作行程：連上伺服器 ("host:port" 或 Unix socket 路徑) 跑 n_bots 個用戶端，回傳各步往返延遲
+    host, _, port = address.rpartition(":")
+    async def connect():
+        if host and port.isdigit(): return await asyncio.open_connection(host, int(port))
+        return await asyncio.open_unix_connection(address)
+    async def run():
+        connections = [await connect() for _ in range(n_bots)]
+        rng, latencies = random.Random(seed), []
+        await asyncio.gather(*(bot_player(reader, writer, random.Random(rng.random()), latencies, think) for reader, writer in connections))
+        return latencies
+    return asyncio.run(run())
+
+async def host_load_test(pool, bots, seed, think, unix_path, address):
+    # 未指定 address 時在本行程啟動伺服器，並量測伺服器在測試期間用掉的 CPU 時間
+    server, listener = None, None
+    if address is None:
+        server = MatchServer(random.Random(seed))
+        listener = await serve(server, port=0, unix_path=unix_path)
+        address = unix_path or f"127.0.0.1:{listener.sockets[0].getsockname()[1]}"
+    rng = random.Random(seed)
+    started, cpu_started = time.perf_counter(), time.process_time()
+    result = pool.starmap_async(run_bots, [(address, n_bots, rng.random(), think) for n_bots in bots])
+    batches = await asyncio.get_running_loop().run_in_executor(None, result.get)
+    elapsed = time.perf_counter() - started
+    if server:
+        while server.connections: await asyncio.sleep(0.01)  # 等伺服器端處理完所有斷線
+        listener.close()
+        await listener.wait_closed()
+    return [latency for batch in batches for latency in batch], elapsed, (time.process_time() - cpu_started) if server else None
+
+def load_test(matches, seed=0, think=0.05, unix_path=None, address=None, workers=None):
+    # 工作行程在啟動事件迴圈之前建立 (fork 時本行程還沒有迴圈與執行緒)
+    workers = workers or max(1, min(8, (os.cpu_count() or 2) - 1))
+    bots = [n for n in (matches * 2 * (k + 1) // workers - matches * 2 * k // workers for k in range(workers)) if n]
+    with multiprocessing.Pool(len(bots)) as pool:
+        latencies, elapsed, server_cpu = asyncio.run(host_load_test(pool, bots, seed, think, unix_path, address))
+    latencies.sort()
+    return {"matches": matches, "moves": len(latencies), "seconds": elapsed, "workers": len(bots), "server_cpu": server_cpu,
+            "p50_ms": statistics.median(latencies) * 1e3, "p99_ms": latencies[int(len(latencies) * 0.99)] * 1e3}
+
+def match_memory(matches=500, seed=0, rows=BOARD_ROWS, cols=BOARD_COLS):
+    # 伺服器端每局狀態 (Match + GameState) 在終局時 (最大) 的記憶體，不含連線緩衝區
+    rng = random.Random(seed)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    hosted = [Match(i, GameState(rng=rng, rows=rows, cols=cols, sparse=True), (None, None)) for i in range(matches)]
+    for match in hosted:
+        game = match.game
+        while game.game_phase != "ENDED":
+            r, c = game.board.random_empty_cell(rng)
+            game.play(r, c, rng.randrange(4))
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size / matches / 1024
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="河流農場 對戰伺服器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="改用 Unix socket 路徑")
+    parser.add_argument("--load-test", type=int, metavar="N", help="以本機用戶端同時進行 N 局並回報延遲")
+    parser.add_argument("--connect", metavar="ADDRESS", help="壓力測試改連到已啟動的伺服器 (host:port 或 Unix socket 路徑)")
+    parser.add_argument("--think", type=float, default=0.05, help="壓力測試用戶端每步的平均思考時間 (秒)")
+    parser.add_argument("--seed", type=int, default=0, help="壓力測試的亂數種子")
+    parser.add_argument("--workers", type=int, default=None, help="壓力測試用戶端的行程數 (預設為 CPU 核心數 - 1，至少 1、最多 8)")
+    args = parser.parse_args(argv)
+
+    if args.load_test:
+        result = load_test(args.load_test, args.seed, args.think, args.unix, args.connect, args.workers)
+        print(f"{result['matches']} 局 {result['moves']} 步 (用戶端 {result['workers']} 個行程)，耗時 {result['seconds']:.1f} 秒；"
+              f"往返延遲 p50 {result['p50_ms']:.2f} ms、p99 {result['p99_ms']:.2f} ms")
+        if result["server_cpu"] is not None:
+            print(f"伺服器 CPU {result['server_cpu']:.2f} 秒 (每步 {result['server_cpu'] / max(result['moves'], 1) * 1e6:.0f} us)")
+        print(f"每局狀態約 {match_memory(seed=args.seed):.1f} KiB (終局)")
+        return 0
+
+    async def run():
+        listener = await serve(MatchServer(), args.host, args.port, args.unix)
+        gc.freeze()  # 啟動時載入的模組物件不再參與循環垃圾回收，縮短完整回收的停頓
+        print(f"伺服器啟動: {args.unix or f'{args.host}:{args.port}'}")
+        async with listener: await listener.serve_forever()
+    try: asyncio.run(run())
+    except KeyboardInterrupt: pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import random
+import time
+
+from engine import GameState, DISTINCT_ROTATIONS, BOARD_ROWS, BOARD_COLS, MIN_BOARD_TILES, valid_board_size
+from record import GameRecorder, CorpusWriter
+from hints import evaluate_game
+
+# ==============================================================================
+# 無介面批次自我對戰：統計先手優勢、田地位置影響與分數分布
+# 每局使用由 (seed, 局號) 推得的亂數，與行程數量無關，結果可重現
+# ==============================================================================
+
+def random_policy(game, rng):
+    r, c = game.board.random_empty_cell(rng)
+    tile_type = game.pending_tile()[0]
+    return r, c, rng.choice(DISTINCT_ROTATIONS[tile_type])
+
+def greedy_policy(game, rng):
+    # 選擇讓 (自己分數 - 對手分數) 增加最多的位置，同分隨機
+    me = game.current_player_index
+    best, best_value = [], None
+    for r, c, rotation, scores, _ in evaluate_game(game):
+        value = scores[me] - scores[1 - me]
+        if best_value is None or value > best_value: best, best_value = [(r, c, rotation)], value
+        elif value == best_value: best.append((r, c, rotation))
+    return rng.choice(best)
+
+POLICIES = {"random": random_policy, "greedy": greedy_policy}
+
+def resolve_policy(name):
+    # 內建名稱，或 "模組:函式" 形式的自訂策略
+    if name in POLICIES: return POLICIES[name]
+    module_name, _, attr = name.partition(":")
+    if not attr: raise ValueError(f"未知的策略: {name}")
+    return getattr(importlib.import_module(module_name), attr)
+
+class SimulationStats:
+    def __init__(self):
+        self.games = 0
+        self.wins = [0, 0, 0]  # 玩家1、玩家2、平手
+        self.score_hist = {1: {}, 2: {}}
+        self.setup_cells = {}  # (r, c) -> [放置次數, 放置者獲勝次數]
+        self.cell_value = {}   # (r, c) -> [放置次數, 分差變化總和]
+
+    def record(self, scores, setup, deltas):
+        self.games += 1
+        self.wins[0 if scores[0] > scores[1] else 1 if scores[1] > scores[0] else 2] += 1
+        for player_id in [1, 2]:
+            hist = self.score_hist[player_id]
+            hist[scores[player_id - 1]] = hist.get(scores[player_id - 1], 0) + 1
+        for player_id, cell in setup:
+            entry = self.setup_cells.setdefault(cell, [0, 0])
+            entry[0] += 1
+            if scores[player_id - 1] > scores[2 - player_id]: entry[1] += 1
+        for cell, delta in deltas:
+            entry = self.cell_value.setdefault(cell, [0, 0])
+            entry[0] += 1; entry[1] += delta
+
+    def merge(self, other):
+        self.games += other.games
+        self.wins = [a + b for a, b in zip(self.wins, other.wins)]
+        for player_id in [1, 2]:
+            for score, n in other.score_hist[player_id].items():
+                self.score_hist[player_id][score] = self.score_hist[player_id].get(score, 0) + n
+        for table, other_table in ((self.setup_cells, other.setup_cells), (self.cell_value, other.cell_value)):
+            for cell, (a, b) in other_table.items():
+                entry = table.setdefault(cell, [0, 0])
+                entry[0] += a; entry[1] += b
+        return self
+
+    def summary(self):
+        games = max(self.games, 1)
+        return {
+            "games": self.games,
+            "win_rate": {"player1": self.wins[0] / games, "player2": self.wins[1] / games, "draw": self.wins[2] / games},
+            "score_hist": {str(p): dict(sorted(h.items())) for p, h in self.score_hist.items()},
+            "setup_win_rate": {f"{r},{c}": wins / n for (r, c), (n, wins) in sorted(self.setup_cells.items())},
+            "cell_value": {f"{r},{c}": total / n for (r, c), (n, total) in sorted(self.cell_value.items())},
+        }
+
+def play_game(rng, policies, rows=BOARD_ROWS, cols=BOARD_COLS, sparse=False, records=None):
+    game = GameState(rng=rng, rows=rows, cols=cols, sparse=sparse)
+    if records is not None: records.append(GameRecorder(game))
+    setup, deltas = [], []
+    while game.game_phase != "ENDED":
+        me, phase = game.current_player_index, game.game_phase
+        before = game.scores()
+        r, c, rotation = policies[me](game, rng)
+        game.play(r, c, rotation)
+        if phase == "SETUP": setup.append((me + 1, (r, c)))
+        else:
+            after = game.scores()
+            deltas.append(((r, c), (after[me] - after[1 - me]) - (before[me] - before[1 - me])))
+    return game.scores(), setup, deltas
+
+def run_chunk(task):
+    seed, start, count, policy_names, board_size, record = task
+    policies = [resolve_policy(name) for name in policy_names]
+    stats = SimulationStats()
+    records = [] if record else None
+    for game_index in range(start, start + count):
+        stats.record(*play_game(random.Random(f"{seed}:{game_index}"), policies, *board_size, records=records))
+    return stats, records
+
+def simulate(games, policies=("random", "random"), seed=0, workers=None, chunk_size=200, progress=None, rows=BOARD_ROWS, cols=BOARD_COLS, sparse=False, record=None):
+    tasks = [(seed, start, min(chunk_size, games - start), tuple(policies), (rows, cols, sparse), bool(record)) for start in range(0, games, chunk_size)]
+    total = SimulationStats()
+    writer = CorpusWriter(record) if record else None
+    def collect(results):
+        # 每個區塊完成就合併，不保留個別對局；紀錄依局號順序寫入對局庫
+        for stats, records in results:
+            total.merge(stats)
+            for recorder in records or (): writer.add(recorder)
+            if progress: progress(total)
+    try:
+        if workers == 1: collect(map(run_chunk, tasks))
+        else:
+            with multiprocessing.Pool(workers or os.cpu_count()) as pool: collect((pool.imap if record else pool.imap_unordered)(run_chunk, tasks))
+    finally:
+        if writer: writer.close()
+    return total
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="河流農場 自我對戰模擬")
+    parser.add_argument("--games", type=int, default=10000, help="對局數")
+    parser.add_argument("--seed", type=int, default=0, help="亂數種子")
+    parser.add_argument("--workers", type=int, default=None, help="行程數 (預設為 CPU 核心數)")
+    parser.add_argument("--chunk-size", type=int, default=200, help="每個工作區塊的對局數")
+    parser.add_argument("--p1", default="random", help="玩家1 策略: random / greedy / 模組:函式")
+    parser.add_argument("--p2", default="random", help="玩家2 策略")
+    parser.add_argument("--rows", type=int, default=BOARD_ROWS, help="棋盤列數 (板塊)")
+    parser.add_argument("--cols", type=int, default=BOARD_COLS, help="棋盤行數 (板塊)")
+    parser.add_argument("--sparse", action="store_true", help="只保存已放置的板塊 (大地圖用)")
+    parser.add_argument("--output", help="將統計結果寫入 JSON 檔")
+    parser.add_argument("--record", help="將每局棋譜附加到對局庫檔案 (見 record.py)")
+    args = parser.parse_args(argv)
+    if not valid_board_size(args.rows, args.cols): parser.error(f"棋盤至少 1x1 且共 {MIN_BOARD_TILES} 格以上")
+
+    started = time.perf_counter()
+    def progress(stats): print(f"\r{stats.games}/{args.games} 局", end="", flush=True)
+    stats = simulate(args.games, (args.p1, args.p2), args.seed, args.workers, args.chunk_size, progress, args.rows, args.cols, args.sparse, args.record)
+    elapsed = time.perf_counter() - started
+    print(f"\n完成 {stats.games} 局，耗時 {elapsed:.1f} 秒 ({stats.games / elapsed:.0f} 局/秒)")
+    summary = stats.summary()
+    print(json.dumps(summary["win_rate"], ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f: json.dump(summary, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()